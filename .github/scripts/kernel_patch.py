@@ -1,9 +1,15 @@
 import argparse
+import functools
 import os
+import re
+import shutil
 import subprocess
 import sys
-from dataclasses import dataclass
-from typing import List, Optional
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, TextIO, Tuple
 
 
 KERNEL_DRIVERS_REL_PATH = "common/drivers"
@@ -11,13 +17,71 @@ KERNEL_KSU_DRIVER_REL_PATH = f"{KERNEL_DRIVERS_REL_PATH}/kernelsu"
 KERNEL_DRIVERS_MAKEFILE = f"{KERNEL_DRIVERS_REL_PATH}/Makefile"
 KERNEL_DRIVERS_KCONFIG = f"{KERNEL_DRIVERS_REL_PATH}/Kconfig"
 
+Version = Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class TextFixup:
+    """A declarative, idempotent text replacement in a kernel tree.
+
+    On each line of `path` (relative to the kernel source) the first `old`
+    becomes `new`, like sed's s///; lines that already contain `new` are left
+    alone. The fixup only applies on hosts with glibc >= `min_glibc`, and not
+    to trees that contain `unless_exists`.
+    """
+
+    name: str
+    path: str
+    old: str
+    new: str
+    min_glibc: Optional[Version] = None
+    unless_exists: Optional[str] = None
+
+    def applies_to(self, kernel_source_path: str, glibc: Optional[Version]) -> bool:
+        if self.min_glibc is not None and (glibc is None or glibc < self.min_glibc):
+            return False
+        return not (self.unless_exists and
+                    os.path.exists(os.path.join(kernel_source_path, self.unless_exists)))
+
+    def apply(self, content: str) -> str:
+        return "".join(
+            line if self.new in line else line.replace(self.old, self.new, 1)
+            for line in content.splitlines(keepends=True))
+
+
+# Host toolchain workarounds, applied in order. Trees with build/build.sh
+# build in their own prebuilt environment and are left alone.
+COMPAT_FIXUPS: Tuple[TextFixup, ...] = (
+    TextFixup(
+        # glibc 2.38 headers need the host CFLAGS passed down to the libsubcmd build.
+        name="Pass CFLAGS to libsubcmd in resolveBtfids/Makefile (glibc >= 2.38)",
+        path="common/tools/bpf/resolveBtfids/Makefile",
+        old="$(Q)$(MAKE) -C $(SUBCMDSRC) OUTPUT=$(abspath $(dir $@))/ $(abspath $@)",
+        new='$(Q)$(MAKE) -C $(SUBCMDSRC) EXTRACFLAGS="$(CFLAGS)" OUTPUT=$(abspath $(dir $@))/ $(abspath $@)',
+        min_glibc=(2, 38),
+        unless_exists="build/build.sh",
+    ),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def glibc_version() -> Optional[Version]:
+    """Version of the glibc this interpreter runs on, e.g. (2, 40); None if not glibc."""
+    try:
+        value = os.confstr("CS_GNU_LIBC_VERSION")
+    except (AttributeError, ValueError, OSError):
+        return None
+    if not value or not value.startswith("glibc "):
+        return None
+    numbers = re.findall(r"\d+", value.split()[-1])
+    return tuple(int(number) for number in numbers) or None
+
 
 @dataclass
 class KsuPatchConfig:
     """Configuration for KernelSU source patching."""
 
     kernel_source_path: str
-    debug: bool
     ksu_source_path: str
 
 
@@ -28,10 +92,14 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument("--debug",
                         action="store_true",
                         help="Enable debug features for the kernel.")
-    parser.add_argument("--kernel-source-path",
-                        type=str,
-                        required=True,
-                        help="Path to the Android kernel source.")
+    trees = parser.add_mutually_exclusive_group(required=True)
+    trees.add_argument("--kernel-source-path",
+                       type=str,
+                       help="Path to the Android kernel source.")
+    trees.add_argument("--manifest",
+                       type=str,
+                       help="File listing Android kernel source paths, one per line, "
+                       "to patch in parallel.")
     parser.add_argument("--ksu-source-path",
                         type=str,
                         required=True,
@@ -40,6 +108,18 @@ def parse_arguments() -> argparse.Namespace:
                         type=str,
                         required=True,
                         help="Path to the workspace.")
+    parser.add_argument("--dry-run",
+                        action="store_true",
+                        help="Print the planned changes without applying them.")
+    parser.add_argument("--jobs",
+                        type=int,
+                        default=0,
+                        help="Trees patched at once with --manifest. Default: one per CPU.")
+    parser.add_argument("--log-dir",
+                        type=str,
+                        default="kernel_patch_logs",
+                        help="Per-tree logs with --manifest, relative to the workspace. "
+                        "Default: kernel_patch_logs.")
     return parser.parse_args()
 
 
@@ -107,16 +187,73 @@ def run_command(command: List[str],
         raise
 
 
-def append_line_once(file_path: str, line: str) -> None:
-    """Append a line to a file only when it is missing."""
-    with open(file_path, "r", encoding="utf-8") as file:
-        content = file.read()
-    if line.strip() in content:
-        return
-    with open(file_path, "a", encoding="utf-8") as file:
+def write_file_atomically(file_path: str, content: str) -> None:
+    """Replace a file's content through a temporary file in the same directory."""
+    file_path = os.path.realpath(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path),
+                                    prefix=f".{os.path.basename(file_path)}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(content)
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@dataclass
+class PatchPlan:
+    """Changes still needed to integrate KernelSU, computed before anything is touched."""
+
+    steps: List[str] = field(default_factory=list)
+    symlinks: List[Tuple[str, str]] = field(default_factory=list)
+    # Path -> content with all planned edits applied; each file is read once.
+    contents: Dict[str, str] = field(default_factory=dict)
+    edited: List[str] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not self.steps
+
+    def read(self, file_path: str) -> str:
+        if file_path not in self.contents:
+            with open(file_path, "r", encoding="utf-8") as file:
+                self.contents[file_path] = file.read()
+        return self.contents[file_path]
+
+    def link(self, target: str, link_path: str, step: str) -> None:
+        self.symlinks.append((target, link_path))
+        self.steps.append(step)
+
+    def edit(self, file_path: str, content: str, step: str) -> None:
+        self.contents[file_path] = content
+        if file_path not in self.edited:
+            self.edited.append(file_path)
+        self.steps.append(step)
+
+    def append_line_once(self, file_path: str, line: str, step: str) -> None:
+        """Plan appending a line to a file only when it is missing."""
+        content = self.read(file_path)
+        if line.strip() in content:
+            return
         if content and not content.endswith("\n"):
-            file.write("\n")
-        file.write(line)
+            content += "\n"
+        self.edit(file_path, content + line, step)
+
+    def report(self, nothing_to_do: str = "the kernel source is already patched") -> None:
+        if self.empty:
+            print(f"[+] Nothing to do, {nothing_to_do}")
+            return
+        print("[+] Planned changes:")
+        for step in self.steps:
+            print(f"    - {step}")
+
+    def apply(self) -> None:
+        for target, link_path in self.symlinks:
+            os.symlink(target, link_path)
+        for file_path in self.edited:
+            write_file_atomically(file_path, self.contents[file_path])
 
 
 class KernelPatcher:
@@ -125,13 +262,9 @@ class KernelPatcher:
     def __init__(self, config: KsuPatchConfig):
         self.config = config
 
-    def setup_kernelsu(self) -> None:
-        """Integrate KernelSU source into the Android kernel source."""
-        print()
-        print("=" * 50)
-        print("Setup KernelSU")
-        print("=" * 50)
-
+    def plan_kernelsu(self) -> PatchPlan:
+        """Work out which integration steps are still needed."""
+        plan = PatchPlan()
         kernelsu_driver_path = os.path.join(self.config.kernel_source_path,
                                             KERNEL_KSU_DRIVER_REL_PATH)
         expected_driver_target = os.path.join(self.config.ksu_source_path,
@@ -144,26 +277,20 @@ class KernelPatcher:
             if current_target != os.path.abspath(expected_driver_target):
                 raise RuntimeError(
                     f"Unexpected KernelSU driver symlink target: {current_target}")
-            print("[+] KernelSU driver symlink already exists")
-        elif os.path.lexists(kernelsu_driver_path):
-            print("[+] KernelSU driver already exists in kernel source")
-        else:
-            print(
-                f"[+] Linking KernelSU driver to {self.config.kernel_source_path}/{KERNEL_DRIVERS_REL_PATH}"
-            )
-            os.symlink(expected_driver_target, kernelsu_driver_path)
-
-        print("[+] Add KernelSU driver to Makefile")
-        append_line_once(
+        elif not os.path.lexists(kernelsu_driver_path):
+            plan.link(
+                expected_driver_target, kernelsu_driver_path,
+                f"Link KernelSU driver to {self.config.kernel_source_path}/{KERNEL_DRIVERS_REL_PATH}")
+
+        plan.append_line_once(
             os.path.join(self.config.kernel_source_path, KERNEL_DRIVERS_MAKEFILE),
-            "obj-$(CONFIG_KSU) += kernelsu/\n")
+            "obj-$(CONFIG_KSU) += kernelsu/\n", "Add KernelSU driver to Makefile")
 
-        print("[+] Add KernelSU driver to Kconfig")
         kconfig_path = os.path.join(self.config.kernel_source_path,
                                     KERNEL_DRIVERS_KCONFIG)
-        with open(kconfig_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
-        if not any("drivers/kernelsu/Kconfig" in line for line in lines):
+        kconfig = plan.read(kconfig_path)
+        if "drivers/kernelsu/Kconfig" not in kconfig:
+            lines = kconfig.splitlines(keepends=True)
             insert_pos = None
             for index in range(len(lines) - 1, -1, -1):
                 if lines[index].strip() == "endmenu":
@@ -172,43 +299,63 @@ class KernelPatcher:
             if insert_pos is None:
                 raise RuntimeError(f"Could not find endmenu in {kconfig_path}")
             lines.insert(insert_pos, 'source "drivers/kernelsu/Kconfig"\n')
-            with open(kconfig_path, "w", encoding="utf-8") as file:
-                file.writelines(lines)
-
-        if self.config.debug:
-            print("[+] Enable debug features for KernelSU")
-            append_line_once(os.path.join(self.config.ksu_source_path,
-                                          "kernel/Kbuild"),
-                             "ccflags-y += -DCONFIG_KSU_DEBUG\n")
-
-        print("[+] Apply compilation patches")
-        build_sh_path = os.path.join(self.config.kernel_source_path,
-                                     "build/build.sh")
-        if not os.path.exists(build_sh_path):
-            try:
-                ldd_result = run_command(["ldd", "--version"], check=False)
-                ldd_output = ldd_result.stdout or ""
-                if ldd_output:
-                    glibc_version_line = ldd_output.splitlines()[0]
-                    glibc_version = glibc_version_line.split()[-1]
-                    print(f"GLIBCVERSION: {glibc_version}")
-                    if float(glibc_version) >= 2.38:
-                        print("Patching resolveBtfids/Makefile")
-                        makefile_path = os.path.join(
-                            self.config.kernel_source_path,
-                            "common/tools/bpf/resolveBtfids/Makefile")
-                        if os.path.exists(makefile_path):
-                            run_command([
-                                "sed", "-i",
-                                r'/\$(Q)\$(MAKE) -C \$(SUBCMDSRC) OUTPUT=\$(abspath \$(dir \$@))\/ \$(abspath \$@)/s//$(Q)$(MAKE) -C $(SUBCMDSRC) EXTRACFLAGS="$(CFLAGS)" OUTPUT=$(abspath $(dir $@))\/ $(abspath $@)/',
-                                makefile_path
-                            ],
-                                        check=False)
-            except Exception as exc:
-                print(f"Could not check GLIBC version or patch: {exc}")
+            plan.edit(kconfig_path, "".join(lines), "Add KernelSU driver to Kconfig")
+
+        self.plan_compat_fixups(plan)
+        return plan
+
+    def plan_compat_fixups(self, plan: PatchPlan) -> None:
+        """Plan the COMPAT_FIXUPS that apply to this tree on this host."""
+        glibc = glibc_version()
+        print(f"GLIBCVERSION: {'.'.join(map(str, glibc)) if glibc else 'unknown'}")
+        for fixup in COMPAT_FIXUPS:
+            if not fixup.applies_to(self.config.kernel_source_path, glibc):
+                continue
+            file_path = os.path.join(self.config.kernel_source_path, fixup.path)
+            if not os.path.exists(file_path):
+                continue
+            content = plan.read(file_path)
+            patched = fixup.apply(content)
+            if patched != content:
+                plan.edit(file_path, patched, fixup.name)
+
+    def setup_kernelsu(self, dry_run: bool = False) -> bool:
+        """Integrate KernelSU source into the Android kernel source; return whether anything changed."""
+        print()
+        print("=" * 50)
+        print("Setup KernelSU")
+        print("=" * 50)
+
+        plan = self.plan_kernelsu()
+        plan.report()
+        if dry_run or plan.empty:
+            return False
 
+        plan.apply()
         run_command(["repo", "status"], cwd=self.config.kernel_source_path)
         print("[+] KernelSU patching done.")
+        return True
+
+
+def setup_ksu_debug(ksu_dir: str, dry_run: bool = False) -> None:
+    """Enable KernelSU debug features in the KernelSU source.
+
+    This edits the KernelSU repo that every kernel tree links to, not a kernel
+    tree, so it is planned and applied once, apart from the per-tree plans, and
+    does not make a kernel tree count as changed.
+    """
+    print()
+    print("=" * 50)
+    print("Setup KernelSU debug")
+    print("=" * 50)
+
+    plan = PatchPlan()
+    plan.append_line_once(os.path.join(ksu_dir, "kernel/Kbuild"),
+                          "ccflags-y += -DCONFIG_KSU_DEBUG\n",
+                          "Enable debug features for KernelSU")
+    plan.report("KernelSU debug features are already enabled")
+    if not dry_run:
+        plan.apply()
 
 
 def clean_workspace(android_kernel_path: str) -> None:
@@ -234,12 +381,8 @@ def clean_workspace(android_kernel_path: str) -> None:
     run_command(["repo", "status"], cwd=android_kernel_path)
 
 
-def main(args: argparse.Namespace) -> None:
-    """Main entry point for the patch script."""
-    workspace = args.workspace
-    kernel_source_path = path_to_absolute(workspace, args.kernel_source_path)
-    ksu_dir = path_to_absolute(workspace, args.ksu_source_path)
-
+def patch_kernel_tree(kernel_source_path: str, ksu_dir: str, dry_run: bool) -> bool:
+    """Patch one kernel tree and commit the result; return whether anything changed."""
     print("kernel source at:", kernel_source_path)
     print("ksu source at:", ksu_dir)
 
@@ -249,11 +392,164 @@ def main(args: argparse.Namespace) -> None:
 
     patcher = KernelPatcher(
         KsuPatchConfig(kernel_source_path=kernel_source_path,
-                       debug=args.debug,
                        ksu_source_path=ksu_dir))
-    patcher.setup_kernelsu()
-    clean_workspace(kernel_source_path)
+    if patcher.setup_kernelsu(dry_run=dry_run):
+        clean_workspace(kernel_source_path)
+        return True
+    if dry_run:
+        print("[+] Dry run, nothing was changed")
+    return False
+
+
+class PrefixedWriter:
+    """Text stream that writes each line to a log file with a prefix."""
+
+    def __init__(self, log: TextIO, prefix: str):
+        self.log = log
+        self.prefix = prefix
+        self.pending = ""
+
+    def write(self, text: str) -> int:
+        lines = (self.pending + text).split("\n")
+        self.pending = lines.pop()
+        for line in lines:
+            self.log.write(f"{self.prefix} {line}\n")
+        return len(text)
+
+    def flush(self) -> None:
+        self.log.flush()
+
+    def close(self) -> None:
+        if self.pending:
+            self.log.write(f"{self.prefix} {self.pending}\n")
+            self.pending = ""
+        self.log.flush()
+
+
+@dataclass
+class TreeResult:
+    """Outcome of patching one tree in --manifest mode."""
+
+    name: str
+    kernel_source_path: str
+    log_path: str
+    seconds: float = 0.0
+    status: str = "ok"
+    changed: bool = False
+
+
+def patch_tree_logged(result: TreeResult, ksu_dir: str, dry_run: bool) -> TreeResult:
+    """Pool task: patch_kernel_tree() with all output going to the tree's log."""
+    start = time.perf_counter()
+    with open(result.log_path, "w", encoding="utf-8") as log:
+        writer = PrefixedWriter(log, f"[{result.name}]")
+        sys.stdout = sys.stderr = writer
+        try:
+            result.changed = patch_kernel_tree(result.kernel_source_path, ksu_dir, dry_run)
+        except SystemExit as exc:
+            # run_command exits on a failed command.
+            result.status = f"failed (exit {exc.code})"
+        except Exception as exc:
+            print(f"Patching failed: {exc}")
+            result.status = "failed"
+        finally:
+            sys.stdout = sys.__stdout__
+            sys.stderr = sys.__stderr__
+            writer.close()
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def read_manifest(manifest_path: str, workspace: str) -> List[str]:
+    """Absolute kernel source paths from a manifest; blank lines and # comments are skipped.
+
+    Two workers must never patch the same tree, so an entry that names an
+    already listed tree (possibly through another path) is dropped.
+    """
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        entries = [line.split("#", 1)[0].strip() for line in file]
+    paths: List[str] = []
+    seen: Dict[str, str] = {}
+    for entry in entries:
+        if not entry:
+            continue
+        path = path_to_absolute(workspace, entry)
+        real_path = os.path.realpath(path)
+        if real_path in seen:
+            print(f"[!] Skipping duplicate manifest entry {entry} (same tree as {seen[real_path]})")
+            continue
+        seen[real_path] = entry
+        paths.append(path)
+    return paths
+
+
+def tree_names(paths: List[str]) -> List[str]:
+    """Short unique names for the trees: the directory name, or more of the path when it clashes."""
+    names = [os.path.basename(path.rstrip(os.sep)) for path in paths]
+    if len(set(names)) != len(names):
+        common = os.path.commonpath(paths)
+        names = [os.path.relpath(path, common).replace(os.sep, "_") for path in paths]
+    return names
+
+
+def patch_manifest(args: argparse.Namespace, ksu_dir: str) -> int:
+    """Patch every tree in the manifest concurrently and print a summary table."""
+    workspace = args.workspace
+    kernel_source_paths = read_manifest(path_to_absolute(workspace, args.manifest), workspace)
+    if not kernel_source_paths:
+        print(f"No kernel source paths in {args.manifest}")
+        return 1
+    log_dir = path_to_absolute(workspace, args.log_dir)
+    os.makedirs(log_dir, exist_ok=True)
+    results = [
+        TreeResult(name=name,
+                   kernel_source_path=path,
+                   log_path=os.path.join(log_dir, f"{name}.log"))
+        for name, path in zip(tree_names(kernel_source_paths), kernel_source_paths)
+    ]
+
+    jobs = min(args.jobs or os.cpu_count() or 1, len(results))
+    print(f"Patching {len(results)} kernel trees with {jobs} workers, logs in {log_dir}", flush=True)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(patch_tree_logged, result, ksu_dir, args.dry_run)
+            for result in results
+        ]
+        for index, future in enumerate(futures):
+            try:
+                results[index] = future.result()
+            except Exception as exc:
+                results[index].status = f"failed ({exc})"
+            print(f"[{results[index].name}] {results[index].status}", flush=True)
+    elapsed = time.perf_counter() - start
+
+    name_width = max(len("Tree"), *(len(result.name) for result in results))
+    print()
+    print(f"{'Tree':<{name_width}}  {'Status':<18} {'Changed':<8} {'Time':>8}  Log")
+    for result in results:
+        changed = "yes" if result.changed else "no"
+        print(f"{result.name:<{name_width}}  {result.status:<18} {changed:<8} "
+              f"{result.seconds:>7.1f}s  {result.log_path}")
+    failed = sum(1 for result in results if result.status != "ok")
+    print(f"{len(results) - failed}/{len(results)} trees patched in {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+def main(args: argparse.Namespace) -> int:
+    """Main entry point for the patch script."""
+    workspace = args.workspace
+    ksu_dir = path_to_absolute(workspace, args.ksu_source_path)
+    if args.debug:
+        # Shared by every tree, so done here once rather than by each --manifest worker.
+        setup_ksu_debug(ksu_dir, args.dry_run)
+    if args.manifest:
+        return patch_manifest(args, ksu_dir)
+
+    kernel_source_path = path_to_absolute(workspace, args.kernel_source_path)
+    patch_kernel_tree(kernel_source_path, ksu_dir, args.dry_run)
+    return 0
 
 
 if __name__ == "__main__":
-    main(parse_arguments())
+    sys.exit(main(parse_arguments()))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Benchmark kernel/.vscode/generate_compdb.py on a synthetic kernel out dir.
+
+Generates a deterministic tree of *.o.cmd files shaped like the ones Kbuild
+writes (savedcmd_, source_ and a deps_ list per object), then times cold
+rebuilds with one file per worker task against batched tasks, inline
+parsing and --templates output, followed by incremental runs that reuse the
+cache.
+
+Results are written as JSON; pass --compare with an earlier result file to
+print the relative change per benchmark.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from bench_repack import REPO_ROOT, compare, git_revision, measure
+
+RESULT_FORMAT = 1
+GENERATE_COMPDB = REPO_ROOT / "kernel" / ".vscode" / "generate_compdb.py"
+
+DIRS = (
+    [f"drivers/net/eth{i}" for i in range(40)]
+    + [f"fs/ext{i}" for i in range(20)]
+    + ["kernel/sched", "mm", "net/core", "drivers/kernelsu"]
+)
+
+
+def generate_tree(root: Path, args: argparse.Namespace) -> List[Path]:
+    rng = random.Random(args.seed)
+    flags = " ".join(f"-D CONFIG_OPT_{i}=1" for i in range(args.flags))
+    deps = "".join(f"  include/linux/header{j}.h \\\n" for j in range(args.deps))
+    cmd_files = []
+    for index in range(args.files):
+        rel_dir = f"{rng.choice(DIRS)}/sub{index % 17}"
+        obj = f"{rel_dir}/file{index}.o"
+        src = f"{rel_dir}/file{index}.c"
+        path = root / rel_dir / f".file{index}.o.cmd"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            f"savedcmd_{obj} := clang -Wp,-MMD,{rel_dir}/.file{index}.o.d -nostdinc -I./arch/arm64/include "
+            f"{flags} -c -o {obj} {src}\n\n"
+            f"source_{obj} := {src}\n\n"
+            f"deps_{obj} := \\\n{deps}\n"
+            f"{obj}: $(deps_{obj})\n\n$(deps_{obj}):\n",
+            encoding="utf-8",
+        )
+        cmd_files.append(path)
+    return cmd_files
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory(prefix="ksu-compdb-bench-") as tmp:
+        root = Path(tmp)
+        out_dir = root / "out"
+        work_dir = root / "work"
+        work_dir.mkdir()
+        cmd_files = generate_tree(out_dir, args)
+        tree_bytes = sum(path.stat().st_size for path in cmd_files)
+        print(f"Synthetic tree: {len(cmd_files)} *.o.cmd files, {tree_bytes / (1024 * 1024):.1f} MB", file=sys.stderr)
+
+        def generate(*extra: str) -> None:
+            cmd = [sys.executable, str(GENERATE_COMPDB), "-O", str(out_dir)]
+            if args.jobs:
+                cmd += ["--jobs", str(args.jobs)]
+            subprocess.run(cmd + list(extra), cwd=work_dir, check=True, stderr=subprocess.DEVNULL)
+
+        rng = random.Random(args.seed)
+        touched = rng.sample(cmd_files, max(1, len(cmd_files) * args.changed_percent // 100))
+
+        def touch_and_generate() -> None:
+            for path in touched:
+                os.utime(path)
+            generate()
+
+        results = [
+            measure("cold_batch_size_1", lambda: generate("--rebuild", "--batch-size", "1"), args.repeat, tree_bytes),
+            measure("cold_batched", lambda: generate("--rebuild"), args.repeat, tree_bytes),
+            measure("cold_inline", lambda: generate("--rebuild", "--jobs", "1"), args.repeat, tree_bytes),
+            measure(f"changed_{args.changed_percent}pct", touch_and_generate, args.repeat, tree_bytes),
+            measure("up_to_date", generate, args.repeat, tree_bytes),
+            measure("cold_templates", lambda: generate("--rebuild", "--templates"), args.repeat, tree_bytes),
+        ]
+
+    return {
+        "format": RESULT_FORMAT,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {
+            "files": args.files,
+            "flags": args.flags,
+            "deps": args.deps,
+            "changed_percent": args.changed_percent,
+            "repeat": args.repeat,
+            "jobs": args.jobs,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark generate_compdb.py on a synthetic kernel out dir.")
+    parser.add_argument("--files", type=int, default=50000, help="Number of *.o.cmd files. Default: 50000.")
+    parser.add_argument("--flags", type=int, default=120, help="-D flags per compile command. Default: 120.")
+    parser.add_argument("--deps", type=int, default=150, help="Headers in each deps_ list. Default: 150.")
+    parser.add_argument(
+        "--changed-percent",
+        type=int,
+        default=10,
+        help="Share of files touched before each incremental run. Default: 10.",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark. Default: 3.")
+    parser.add_argument("--jobs", type=int, default=0, help="Passed as --jobs. Default: 0 (one per CPU).")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic tree. Default: 1.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=REPO_ROOT / "benchmarks" / "results-compdb.json",
+        help="Where to write the JSON results. Default: benchmarks/results-compdb.json",
+    )
+    parser.add_argument("--compare", type=Path, help="Earlier results JSON to compare against.")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    results = run_benchmarks(args)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"wrote {args.output}", file=sys.stderr)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
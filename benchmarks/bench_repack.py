@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Benchmark repack_apk.py against synthetic APK-shaped archives.
+
+Generates a deterministic ZIP laid out like a manager APK (configurable
+entry count, sizes, STORED/DEFLATED mix and ABI set) plus fake ELF ksud
+binaries, then times the repack helpers and an end-to-end `repack` run in
+which zipalign, apksigner and llvm-strip are replaced by local stubs, so
+nothing here needs the Android SDK or network access.
+
+Results are written as JSON; pass --compare with an earlier result file to
+print the relative change per benchmark.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import repack_apk  # noqa: E402
+
+RESULT_FORMAT = 1
+
+APKSIGNER_STUB = """\
+import shutil, sys
+args = sys.argv[1:]
+shutil.copyfile(args[-1], args[args.index("--out") + 1])
+"""
+
+ZIPALIGN_STUB = """\
+import sys
+sys.exit(0)
+"""
+
+STRIP_STUB = """\
+import shutil, sys
+args = sys.argv[1:]
+shutil.copyfile(args[-1], args[args.index("-o") + 1])
+"""
+
+
+def entry_payload(rng: random.Random, size: int) -> bytes:
+    """Half random, half repetitive bytes, so DEFLATED entries compress like real resources."""
+    noise = rng.randbytes(size // 2)
+    return noise + (b"ksu-bench-" * (size // 20 + 1))[: size - len(noise)]
+
+
+def fake_elf(rng: random.Random, size: int) -> bytes:
+    header = b"\x7fELF\x02\x01\x01" + b"\0" * 9
+    return header + entry_payload(rng, max(0, size - len(header)))
+
+
+def generate_apk(path: Path, args: argparse.Namespace, rng: random.Random) -> None:
+    with ZipFile(path, "w") as zf:
+        zf.writestr("AndroidManifest.xml", entry_payload(rng, 4096), compress_type=ZIP_DEFLATED)
+        zf.writestr("resources.arsc", entry_payload(rng, args.entry_size * 8), compress_type=ZIP_STORED)
+        for index in range(args.dex_count):
+            zf.writestr(
+                f"classes{index + 1 if index else ''}.dex",
+                entry_payload(rng, args.entry_size * 32),
+                compress_type=ZIP_DEFLATED,
+            )
+        for abi in args.abis:
+            zf.writestr(f"lib/{abi}/libksud.so", fake_elf(rng, args.ksud_size), compress_type=ZIP_DEFLATED)
+            zf.writestr(f"lib/{abi}/libkernelsu.so", fake_elf(rng, args.entry_size * 4), compress_type=ZIP_STORED)
+        for index in range(args.entries):
+            method = ZIP_STORED if rng.random() < args.stored_ratio else ZIP_DEFLATED
+            size = max(1, int(rng.expovariate(1.0 / args.entry_size)))
+            zf.writestr(f"res/drawable/bench_{index:06d}.png", entry_payload(rng, size), compress_type=method)
+
+
+def write_stub(bin_dir: Path, name: str, body: str) -> None:
+    path = bin_dir / name
+    path.write_text(f"#!{sys.executable}\n{body}", encoding="utf-8")
+    path.chmod(0o755)
+
+
+def build_workspace(root: Path, args: argparse.Namespace) -> Dict[str, Path]:
+    """Lay out an isolated workspace: repack_apk.py, input APK, ksud per ABI, stub tools and a keystore."""
+    rng = random.Random(args.seed)
+    apk_dir = root / "manager" / "app" / "build" / "outputs" / "apk" / "release"
+    apk_dir.mkdir(parents=True)
+    apk = apk_dir / "bench.apk"
+    generate_apk(apk, args, rng)
+
+    ksud_by_arch: Dict[str, Path] = {}
+    for abi in args.abis:
+        triple = repack_apk.ARCH_TO_TRIPLE[abi]
+        ksud = root / "target" / triple / "release" / "ksud"
+        ksud.parent.mkdir(parents=True)
+        ksud.write_bytes(fake_elf(rng, args.ksud_size))
+        ksud_by_arch[abi] = ksud
+
+    bin_dir = root / "bin"
+    bin_dir.mkdir()
+    write_stub(bin_dir, "apksigner", APKSIGNER_STUB)
+    write_stub(bin_dir, "zipalign", ZIPALIGN_STUB)
+    write_stub(bin_dir, "llvm-strip", STRIP_STUB)
+
+    shutil.copy2(REPO_ROOT / "repack_apk.py", root / "repack_apk.py")
+    (root / "scripts").mkdir()
+    shutil.copy2(REPO_ROOT / "scripts" / "android_toolchain.py", root / "scripts" / "android_toolchain.py")
+    keystore = root / "bench.jks"
+    keystore.write_bytes(b"not a real keystore")
+    return {"apk": apk, "bin": bin_dir, "keystore": keystore, **{f"ksud:{k}": v for k, v in ksud_by_arch.items()}}
+
+
+def measure(name: str, func: Callable[[], object], repeat: int, size_bytes: int) -> Dict[str, object]:
+    samples: List[float] = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    best = min(samples)
+    result = {
+        "name": name,
+        "repeat": repeat,
+        "min_s": best,
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+        "samples_s": samples,
+        "bytes": size_bytes,
+        "mb_per_s": (size_bytes / (1024 * 1024)) / best if best > 0 else None,
+    }
+    print(f"{name:<28} min {best * 1000:9.2f} ms  median {result['median_s'] * 1000:9.2f} ms", file=sys.stderr)
+    return result
+
+
+def git_revision() -> Optional[str]:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory(prefix="ksu-repack-bench-") as tmp:
+        root = Path(tmp)
+        paths = build_workspace(root, args)
+        apk = paths["apk"]
+        apk_size = apk.stat().st_size
+        ksud_by_arch = {abi: paths[f"ksud:{abi}"] for abi in args.abis}
+        strip_stub = paths["bin"] / "llvm-strip"
+        out = root / "out.apk"
+        print(f"Synthetic APK: {apk_size / (1024 * 1024):.1f} MB, ABIs: {', '.join(args.abis)}", file=sys.stderr)
+
+        results = [
+            measure(
+                "collect_existing_arches",
+                lambda: repack_apk.collect_existing_arches(apk),
+                args.repeat,
+                apk_size,
+            ),
+            measure(
+                "repack_apk",
+                lambda: repack_apk.repack_apk(apk, out, args.abis, ksud_by_arch, jobs=args.jobs),
+                args.repeat,
+                apk_size,
+            ),
+            measure(
+                "repack_apk_strip_stub",
+                lambda: repack_apk.repack_apk(apk, out, args.abis, ksud_by_arch, strip_stub, jobs=args.jobs),
+                args.repeat,
+                apk_size,
+            ),
+            measure(
+                "assert_required_libs",
+                lambda: repack_apk.assert_required_libs(out, args.abis),
+                args.repeat,
+                out.stat().st_size,
+            ),
+        ]
+
+        env = dict(
+            os.environ,
+            PATH=f"{paths['bin']}{os.pathsep}{os.environ.get('PATH', '')}",
+            KSU_TOOLCHAIN_CACHE=str(root / "android-toolchain.json"),
+        )
+        cli = [
+            sys.executable,
+            str(root / "repack_apk.py"),
+            "repack",
+            "-b",
+            "release",
+            "-t",
+            "release",
+            "-K",
+            str(paths["keystore"]),
+            "-A",
+            "bench",
+            "-P",
+            "bench",
+            "-S",
+            "bench",
+            "--force",
+            "--no-strip-cache",
+            "--strip",
+        ]
+        for abi in args.abis:
+            cli += ["-a", abi]
+
+        def run_cli() -> None:
+            subprocess.run(
+                cli,
+                cwd=root,
+                env=env,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+
+        results.append(measure("cli_repack_stub_tools", run_cli, args.repeat, apk_size))
+
+    return {
+        "format": RESULT_FORMAT,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "entries": args.entries,
+            "entry_size": args.entry_size,
+            "stored_ratio": args.stored_ratio,
+            "dex_count": args.dex_count,
+            "abis": args.abis,
+            "ksud_size": args.ksud_size,
+            "repeat": args.repeat,
+            "jobs": args.jobs,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, object], baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("params") != current["params"]:
+        print("[WARN] Baseline was run with different parameters", file=sys.stderr)
+    old = {r["name"]: r for r in baseline.get("results", [])}
+    print(f"{'Benchmark':<28} {'base(ms)':>10} {'now(ms)':>10} {'change':>8}")
+    for result in current["results"]:  # type: ignore[union-attr]
+        prev = old.get(result["name"])
+        now_ms = result["min_s"] * 1000
+        if prev is None:
+            print(f"{result['name']:<28} {'-':>10} {now_ms:>10.2f} {'new':>8}")
+            continue
+        base_ms = prev["min_s"] * 1000
+        change = (now_ms - base_ms) / base_ms * 100 if base_ms else 0.0
+        print(f"{result['name']:<28} {base_ms:>10.2f} {now_ms:>10.2f} {change:>+7.1f}%")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark repack_apk.py on synthetic APKs.")
+    parser.add_argument("--entries", type=int, default=2000, help="Number of resource entries. Default: 2000.")
+    parser.add_argument(
+        "--entry-size", type=int, default=16 * 1024, help="Mean resource entry size in bytes. Default: 16384."
+    )
+    parser.add_argument(
+        "--stored-ratio", type=float, default=0.3, help="Fraction of resource entries left STORED. Default: 0.3."
+    )
+    parser.add_argument("--dex-count", type=int, default=3, help="Number of classes*.dex entries. Default: 3.")
+    parser.add_argument(
+        "--abis",
+        default="arm64-v8a,armeabi-v7a,x86,x86_64",
+        help="Comma separated ABI set. Default: all four Android ABIs.",
+    )
+    parser.add_argument(
+        "--ksud-size", type=int, default=4 * 1024 * 1024, help="Size of each fake ksud in bytes. Default: 4 MiB."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark. Default: 5.")
+    parser.add_argument("--jobs", type=int, default=0, help="Passed to repack_apk() as jobs. Default: 0 (auto).")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic content. Default: 1.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=REPO_ROOT / "benchmarks" / "results.json",
+        help="Where to write the JSON results. Default: benchmarks/results.json",
+    )
+    parser.add_argument("--compare", type=Path, help="Earlier results JSON to compare against.")
+    args = parser.parse_args()
+    args.abis = repack_apk.normalize_arch_values([args.abis])
+    unknown = [abi for abi in args.abis if abi not in repack_apk.ARCH_TO_TRIPLE]
+    if unknown:
+        parser.error(f"unknown ABI(s): {', '.join(unknown)}")
+    return args
+
+
+def main() -> int:
+    args = parse_args()
+    results = run_benchmarks(args)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"wrote {args.output}", file=sys.stderr)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Indexed copy of compile_commands.json, keyed by source path.
+
+generate_compdb.py --index keeps compile_commands.db (SQLite) next to the JSON
+file and updates it in place on every run. `query` prints the entries for
+source files; `serve` answers the same lookups on a Unix socket, one path per
+line in, one JSON array per line out, so editors need not load the JSON file.
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import sqlite3
+import sys
+import threading
+
+from compdb_template import expand_command
+
+
+INDEX_FILE = 'compile_commands.db'
+SOCKET_FILE = 'compile_commands.sock'
+INDEX_VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+-- Command templates (see compdb_template.py), each stored once; the digest keeps the
+-- unique index small.
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY,
+    digest BLOB NOT NULL UNIQUE,
+    template TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT NOT NULL,
+    cmd_file TEXT NOT NULL,
+    file TEXT NOT NULL,
+    output TEXT NOT NULL,
+    template_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_path ON entries (path);
+CREATE INDEX IF NOT EXISTS entries_cmd_file ON entries (cmd_file);
+'''
+
+LOOKUP_SQL = '''
+SELECT entries.file, entries.output, templates.template FROM entries
+JOIN templates ON templates.id = entries.template_id
+WHERE entries.path = ?
+'''
+
+
+def entry_path(directory, file):
+    """The key an entry is indexed under: its source as an absolute, normalized path."""
+    return os.path.normpath(os.path.join(directory, file))
+
+
+def read_meta(index_path):
+    """Meta of the index at index_path, or None when there is no usable index."""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        db = sqlite3.connect(index_path)
+        try:
+            meta = dict(db.execute('SELECT key, value FROM meta'))
+        finally:
+            db.close()
+    except sqlite3.DatabaseError:
+        return None
+    if meta.get('version') != str(INDEX_VERSION):
+        return None
+    return meta
+
+
+def update_index(index_path, templates, file_records, changed, removed, meta):
+    """Bring the index in line with file_records, in one transaction.
+
+    file_records maps every *.o.cmd file to its [template id, output, source]
+    records, with ids into templates; meta must hold the out_dir. Entries of the
+    files in changed are replaced and those of the files in removed dropped;
+    changed=None rebuilds the whole index.
+    """
+    db = sqlite3.connect(index_path, timeout=30)
+    try:
+        # WAL lets a running `serve` keep answering while the index is updated.
+        db.execute('PRAGMA journal_mode=WAL')
+        db.executescript(SCHEMA)
+        with db:
+            if changed is None:
+                db.execute('DELETE FROM entries')
+                db.execute('DELETE FROM templates')
+                changed = file_records
+            else:
+                db.executemany('DELETE FROM entries WHERE cmd_file = ?',
+                               [(cmd_file,) for cmd_file in set(changed) | set(removed)])
+            template_ids = {}
+            rows = []
+            for cmd_file in changed:
+                for template_id, output, source in file_records[cmd_file]:
+                    db_id = template_ids.get(template_id)
+                    if db_id is None:
+                        template = templates[template_id]
+                        digest = hashlib.sha1(template.encode('utf-8')).digest()
+                        db.execute('INSERT OR IGNORE INTO templates (digest, template) VALUES (?, ?)',
+                                   (digest, template))
+                        db_id = template_ids[template_id] = db.execute(
+                            'SELECT id FROM templates WHERE digest = ?', (digest,)).fetchone()[0]
+                    rows.append((entry_path(meta['out_dir'], source), cmd_file, source, output, db_id))
+            db.executemany('INSERT INTO entries (path, cmd_file, file, output, template_id) '
+                           'VALUES (?, ?, ?, ?, ?)', rows)
+            if changed is not file_records:
+                db.execute('DELETE FROM templates WHERE id NOT IN (SELECT template_id FROM entries)')
+            db.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                           sorted(dict(meta, version=str(INDEX_VERSION)).items()))
+    finally:
+        db.close()
+
+
+class IndexReader(object):
+    """Read-only lookups; each thread gets its own SQLite connection."""
+
+    def __init__(self, index_path):
+        if read_meta(index_path) is None:
+            raise IOError('{} is missing or not an index; run generate_compdb.py --index'.format(index_path))
+        self.index_path = os.path.abspath(index_path)
+        self.local = threading.local()
+
+    def _db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect('file:{}?mode=ro'.format(self.index_path), uri=True,
+                                                 check_same_thread=False)
+        return db
+
+    def lookup(self, path):
+        """Compile commands entries for the source file at path (relative to the current directory)."""
+        db = self._db()
+        out_dir = db.execute("SELECT value FROM meta WHERE key = 'out_dir'").fetchone()[0]
+        return [{
+                'directory': out_dir,
+                'command': expand_command(template, output, file),
+                'file': file,
+                'output': output
+            } for file, output, template in db.execute(LOOKUP_SQL, (os.path.abspath(path),))]
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            path = line.decode('utf-8').rstrip('\r\n')
+            try:
+                reply = self.server.reader.lookup(path)
+            except sqlite3.Error as e:
+                reply = {'error': str(e)}
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, reader):
+        self.reader = reader
+        socketserver.UnixStreamServer.__init__(self, socket_path, QueryHandler)
+
+
+def connect_daemon(socket_path):
+    """A connected socket to a running `serve`, or None."""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def do_query(args):
+    sock = connect_daemon(args.socket)
+    results = {}
+    if sock is not None:
+        with sock, sock.makefile('rwb') as stream:
+            for path in args.files:
+                # The daemon may run elsewhere: send absolute paths.
+                stream.write(os.path.abspath(path).encode('utf-8') + b'\n')
+                stream.flush()
+                results[path] = json.loads(stream.readline())
+    else:
+        reader = IndexReader(args.db)
+        for path in args.files:
+            results[path] = reader.lookup(path)
+
+    entries = []
+    missing = False
+    for path in args.files:
+        if isinstance(results[path], dict):
+            print("Lookup of", path, "failed:", results[path].get('error'), file=sys.stderr)
+            missing = True
+        elif not results[path]:
+            print("No entry for", path, file=sys.stderr)
+            missing = True
+        else:
+            entries.extend(results[path])
+    print(json.dumps(entries, indent=1))
+    return 1 if missing else 0
+
+
+def do_serve(args):
+    if not hasattr(socket, 'AF_UNIX'):
+        print("Unix sockets are not available on this platform", file=sys.stderr)
+        return 1
+    reader = IndexReader(args.db)
+    sock = connect_daemon(args.socket)
+    if sock is not None:
+        sock.close()
+        print("A server is already listening on", args.socket, file=sys.stderr)
+        return 1
+    if os.path.exists(args.socket):
+        # Left behind by a server that did not shut down cleanly.
+        os.unlink(args.socket)
+    server = QueryServer(args.socket, reader)
+    # Shut down through the finally below, which removes the socket.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print("Serving", args.db, "on", args.socket, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up compile commands in " + INDEX_FILE)
+    parser.add_argument('--db', default=INDEX_FILE, help="Index written by generate_compdb.py --index (default: {})".format(INDEX_FILE))
+    parser.add_argument('--socket', default=SOCKET_FILE, help="Unix socket of the server (default: {})".format(SOCKET_FILE))
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    query = subparsers.add_parser('query', help="Print the entries for source files, through the server when it runs")
+    query.add_argument('files', nargs='+', help="Source files")
+    query.set_defaults(func=do_query)
+    serve = subparsers.add_parser('serve', help="Answer lookups on the Unix socket until interrupted")
+    serve.set_defaults(func=do_serve)
+    args = parser.parse_args()
+    try:
+        return args.func(args)
+    except (IOError, OSError, sqlite3.Error) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
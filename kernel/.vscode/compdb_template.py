@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Compile commands factored into shared templates and per-file paths.
+
+Kbuild compiles most objects with the same flags, so their commands differ
+only in paths derived from the object and its source. factor_command()
+replaces those with placeholders, and files built with the same flags then
+share one template:
+
+    %s  source path         %o  object path
+    %d  object directory    %b  object name without .o
+    %%  a literal %
+
+A file's entries are kept as [template id, output, source] records.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import re
+
+
+PLACEHOLDER_RE = re.compile(r'%(.)', re.DOTALL)
+
+# Characters that may surround the object name for it to count as %b.
+BASENAME_SEPARATORS = frozenset(' \t\n\'"=,')
+
+
+def path_values(output, source):
+    directory, name = os.path.split(output)
+    return {'s': source, 'o': output, 'd': directory, 'b': name[:-2] if name.endswith('.o') else name}
+
+
+def is_basename_at(command, start, end, directory):
+    """Whether command[start:end] is the object name as a whole word.
+
+    It is often a short word like core or main, so it only counts at the start
+    of a word or define value, right after the object's own directory (also as
+    a hidden .core.o.d), or after Kbuild's kmod_ prefix; and only before a dot,
+    separator or quote. -I drivers/core/include or -Iinclude/core keep their core.
+    """
+    # Skip the dot of a hidden file name.
+    before = start - 1 if start and command[start - 1] == '.' else start
+    at_word_start = before == 0 or command[before - 1] in BASENAME_SEPARATORS
+    after_directory = bool(directory) and command.endswith(directory + '/', 0, before)
+    if not (at_word_start or after_directory or command.endswith('kmod_', 0, start)):
+        return False
+    return end == len(command) or command[end] == '.' or command[end] in BASENAME_SEPARATORS
+
+
+def occurrences(command, code, value, directory):
+    """Start offsets of value in command, overlapping ones included."""
+    start = command.find(value)
+    while start >= 0:
+        if code != 'b' or is_basename_at(command, start, start + len(value), directory):
+            yield start
+        start = command.find(value, start + 1)
+
+
+def factor_command(command, output, source):
+    """Template of command for the object output built from source."""
+    values = path_values(output, source)
+    spans = []
+    # Longest first, so a path wins over the directory or name inside it.
+    for code, value in sorted(values.items(), key=lambda item: -len(item[1])):
+        if not value:
+            continue
+        for start in occurrences(command, code, value, values['d']):
+            end = start + len(value)
+            if not any(start < taken_end and taken_start < end for taken_start, taken_end, _ in spans):
+                spans.append((start, end, code))
+    parts = []
+    pos = 0
+    for start, end, code in sorted(spans):
+        parts.append(command[pos:start].replace('%', '%%'))
+        parts.append('%' + code)
+        pos = end
+    parts.append(command[pos:].replace('%', '%%'))
+    return ''.join(parts)
+
+
+def expand_command(template, output, source):
+    values = dict(path_values(output, source))
+    values['%'] = '%'
+    return PLACEHOLDER_RE.sub(lambda match: values[match.group(1)], template)
+
+
+def json_string_body(value):
+    # JSON escaping works per character, so escaped pieces can be concatenated.
+    return json.dumps(value)[1:-1]
+
+
+class EntryRenderer(object):
+    """Renders records as compile_commands.json array elements.
+
+    The text is what json.dumps gives for the entry dicts (indented as by
+    json.dump(compdb, indent=1), or with compact separators). Each template is
+    split and escaped once; an entry then costs one join.
+    """
+
+    def __init__(self, directory, templates, compact):
+        self.templates = templates
+        self._split = {}
+        directory = json_string_body(directory)
+        if compact:
+            self.layout = ('{"directory":"' + directory + '","command":"', '","file":"', '","output":"', '"}')
+        else:
+            self.layout = (' {\n  "directory": "' + directory + '",\n  "command": "',
+                           '",\n  "file": "', '",\n  "output": "', '"\n }')
+
+    def _template(self, template_id):
+        parts = self._split.get(template_id)
+        if parts is None:
+            parts = PLACEHOLDER_RE.split(self.templates[template_id])
+            # Odd items are placeholder codes; escape the literal text between them now.
+            for i in range(0, len(parts), 2):
+                parts[i] = json_string_body(parts[i])
+            self._split[template_id] = parts
+        return parts
+
+    def entry(self, template_id, output, source):
+        parts = self._template(template_id)
+        values = dict((code, json_string_body(value)) for code, value in path_values(output, source).items())
+        values['%'] = '%'
+        command = ''.join([part if i % 2 == 0 else values[part] for i, part in enumerate(parts)])
+        head, file_key, output_key, tail = self.layout
+        return head + command + file_key + values['s'] + output_key + values['o'] + tail
+
+    def render(self, records):
+        """UTF-8 text of the records' entries, separated as array elements."""
+        return ',\n'.join(self.entry(*record) for record in records).encode('utf-8')
+
+
+class TemplateTable(object):
+    """Interns templates to small ids."""
+
+    def __init__(self, templates=None):
+        self.templates = list(templates or [])
+        self.ids = dict((template, i) for i, template in enumerate(self.templates))
+
+    def intern(self, template):
+        template_id = self.ids.get(template)
+        if template_id is None:
+            template_id = self.ids[template] = len(self.templates)
+            self.templates.append(template)
+        return template_id
+
+    def records(self, factored):
+        """[template id, output, source] records of (template, output, source) tuples."""
+        return [[self.intern(template), output, source] for template, output, source in factored]
+
+    def compacted(self, record_lists):
+        """Renumber the records in place to drop unused templates; return the new template list."""
+        used = {}
+        templates = []
+        for records in record_lists:
+            for record in records:
+                new_id = used.get(record[0])
+                if new_id is None:
+                    new_id = used[record[0]] = len(templates)
+                    templates.append(self.templates[record[0]])
+                record[0] = new_id
+        return templates
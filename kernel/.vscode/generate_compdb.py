@@ -5,16 +5,43 @@ from __future__ import print_function, division
 import argparse
 import fnmatch
 import functools
+import heapq
 import json
-import math
 import multiprocessing
 import os
+import operator
 import re
 import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
+from compdb_index import INDEX_FILE, read_meta, update_index
+from compdb_template import EntryRenderer, TemplateTable, factor_command
 
-CMD_VAR_RE = re.compile(r'^\s*(?:saved)?cmd_(\S+)\s*:=\s*(.+)\s*$', re.MULTILINE)
-SOURCE_VAR_RE = re.compile(r'^\s*source_(\S+)\s*:=\s*(.+)\s*$', re.MULTILINE)
+
+COMPDB_FILE = 'compile_commands.json'
+# Sidecar index of the compdb: per *.o.cmd file its mtime and size, where its entries
+# sit in compile_commands.json and their factored records, so unchanged entries are
+# copied, not re-parsed.
+CACHE_FILE = '.compile_commands.json.cache'
+CACHE_VERSION = 3
+# compile_commands.json factored as in compdb_template.py, for our own tooling.
+TEMPLATE_FILE = 'compile_commands.tpl.json'
+TEMPLATE_FORMAT = 1
+# Below this many changed files, parsing inline beats starting a process pool.
+MIN_POOL_FILES = 64
+DEFAULT_SORT_BUFFER_MB = 64
+# Directory scans run on threads; os.scandir releases the GIL while it waits on the filesystem.
+DISCOVERY_THREADS = 8
+# *.o.cmd files per worker task while the file count is still unknown.
+STREAMING_BATCH_SIZE = 128
+# Upper bound for the adaptive batch size; smaller batches keep the workers evenly loaded.
+MAX_BATCH_SIZE = 512
+# Never descended into; symlinked directories (such as the "source" link in a
+# kernel out dir) are not followed either.
+PRUNE_DIRS = frozenset(['.git'])
+# Where kernel_patch.py links the KernelSU kernel/ directory into a kernel tree.
+KSU_DRIVER_DIR = 'drivers/kernelsu'
 
 
 def print_progress_bar(progress):
@@ -22,70 +49,568 @@ def print_progress_bar(progress):
     print('\r', progress_bar, "{0:.1%}".format(progress), end='\r', file=sys.stderr)
 
 
-def parse_cmd_file(out_dir, cmdfile_path):
-    with open(cmdfile_path, 'r') as cmdfile:
-        cmdfile_content = cmdfile.read()
+# Reused by every read in a process, so parsing a batch does not allocate a buffer per file.
+_read_buffer = bytearray(16 * 1024)
+
+
+def read_lines(cmdfile):
+    """Yield the lines of a file opened unbuffered in binary mode, without their newline.
+
+    Reads go through the shared buffer, and only as far as lines are consumed.
+    """
+    buf = _read_buffer
+    start = end = 0
+    while True:
+        eol = buf.find(b'\n', start, end)
+        if eol >= 0:
+            yield buf[start:eol]
+            start = eol + 1
+            continue
+        if start:
+            # Move the partial line to the front and refill behind it.
+            buf[:end - start] = buf[start:end]
+            end -= start
+            start = 0
+        if end == len(buf):
+            buf.extend(bytes(len(buf)))
+        with memoryview(buf) as view:
+            n = cmdfile.readinto(view[end:])
+        if not n:
+            if end:
+                yield buf[:end]
+            return
+        end += n
+
 
-    commands = { match.group(1): match.group(2) for match in CMD_VAR_RE.finditer(cmdfile_content) }
-    sources = { match.group(1): match.group(2) for match in SOURCE_VAR_RE.finditer(cmdfile_content) }
+def glob_regex(patterns):
+    """One bytes regex matching any of the globs; relative globs may match below any directory."""
+    if not patterns:
+        return None
+    regexes = []
+    for pattern in patterns:
+        # fnmatch's * already crosses '/', so ** means the same.
+        regex = fnmatch.translate(pattern.replace('**', '*'))
+        if not os.path.isabs(pattern):
+            regex = '(?:.*/)?' + regex
+        regexes.append(regex)
+    return re.compile('|'.join(regexes).encode('utf-8'))
 
-    return [{
+
+class SourceScope(object):
+    """Selects entries by their source_ path and decides how that path is written."""
+
+    def __init__(self, include=None, exclude=None, resolve_symlinks=False):
+        self.include = glob_regex(include)
+        self.exclude = glob_regex(exclude)
+        self.resolve_symlinks = resolve_symlinks
+        # Part of the cache key: entries parsed under other options are not reused.
+        self.options = {'include': include or [], 'exclude': exclude or [], 'resolve_symlinks': resolve_symlinks}
+
+    def accepts(self, source):
+        if self.include is not None and not self.include.match(source):
+            return False
+        return self.exclude is None or not self.exclude.match(source)
+
+    def entry(self, out_dir, o_file_name, command, source):
+        if self.resolve_symlinks:
+            # Point clangd at the real file, e.g. the repo's kernel/ instead of drivers/kernelsu.
+            real_source = os.path.realpath(os.path.join(out_dir, source))
+            head, found, tail = command.rpartition(' ' + source)
+            if found and (not tail or tail[0].isspace()):
+                command = head + ' ' + real_source + tail
+            source = real_source
+        return {
             'directory': out_dir,
-            'command': commands[o_file_name],
+            'command': command,
             'file': source,
             'output': o_file_name
-        } for o_file_name, source in sources.items()]
+        }
+
+
+ALL_SOURCES = SourceScope()
+
+
+def parse_cmd_file(out_dir, cmdfile_path, scope=None):
+    commands = {}
+    sources = {}
+    with open(cmdfile_path, 'rb', buffering=0) as cmdfile:
+        for line in read_lines(cmdfile):
+            line = line.lstrip()
+            if line.startswith(b'deps_'):
+                # The deps_ list is most of the file and nothing in it is needed: stop once
+                # every source_ has its command.
+                if sources and all(o_file_name in commands for o_file_name in sources):
+                    break
+                continue
+            if line.startswith(b'source_'):
+                variables, name = sources, line[7:]
+            elif line.startswith(b'savedcmd_'):
+                variables, name = commands, line[9:]
+            elif line.startswith(b'cmd_'):
+                variables, name = commands, line[4:]
+            else:
+                continue
+            name, assign, value = name.partition(b':=')
+            name = name.rstrip()
+            value = value.lstrip()
+            if assign and value and len(name.split()) == 1:
+                variables[bytes(name)] = value
+
+    # Filter before decoding, so commands of files out of scope are never turned into strings.
+    scope = scope or ALL_SOURCES
+    return [scope.entry(out_dir, o_file_name.decode('utf-8'), commands[o_file_name].decode('utf-8'),
+                        source.decode('utf-8'))
+            for o_file_name, source in sources.items() if scope.accepts(source)]
+
+
+def parse_and_factor(out_dir, scope, cmdfile_path):
+    return cmdfile_path, [(factor_command(entry['command'], entry['output'], entry['file']), entry['output'], entry['file'])
+                          for entry in parse_cmd_file(out_dir, cmdfile_path, scope)]
+
+
+def parse_batch(out_dir, scope, cmdfile_paths):
+    """Worker task: (path, [(template, output, source), ...]) for each *.o.cmd file of a batch."""
+    return [parse_and_factor(out_dir, scope, cmdfile_path) for cmdfile_path in cmdfile_paths]
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def adaptive_batch_size(n_files, jobs):
+    # About eight tasks per worker: few enough round trips, yet an even finish.
+    return max(1, min(MAX_BATCH_SIZE, n_files // (jobs * 8)))
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_cache(cache_path, out_dir, options, output_file, output_stamp):
+    try:
+        with open(cache_path, 'r') as cache_file:
+            cache = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if cache.get('version') != CACHE_VERSION or cache.get('out_dir') != out_dir:
+        return None
+    if cache.get('options') != options:
+        return None
+    if cache.get('output') != output_stamp:
+        print(output_file, "changed since the last run, re-parsing everything", file=sys.stderr)
+        return None
+    return cache
+
+
+def copy_range(src, dst, start, length):
+    src.seek(start)
+    while length:
+        data = src.read(min(length, 1 << 20))
+        dst.write(data)
+        length -= len(data)
+
+
+class JsonArrayWriter(object):
+    """Streams a JSON array of pre-rendered elements to a binary file.
+
+    An element is either bytes or a (file, offset, length) range of another
+    array written by this class. Ranges that follow each other in their source
+    file are copied as one, together with the separator between them.
+    """
+
+    SEPARATOR = b',\n'
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.pos = 0
+        self.count = 0
+        self._run = None
+
+    def add(self, data=None, src=None, offset=0, length=0):
+        """Append one element and return its offset in the output."""
+        if data is not None:
+            length = len(data)
+        if self.count:
+            separator = self.SEPARATOR
+            run = self._run
+            if data is None and run is not None and run[0] is src and offset == run[2] + len(separator):
+                run[2] = offset + length
+                self.count += 1
+                self.pos += len(separator) + length
+                return self.pos - length
+        else:
+            separator = b'[\n'
+        self._flush_run()
+        self.out_file.write(separator)
+        self.pos += len(separator)
+        element_offset = self.pos
+        if data is None:
+            self._run = [src, offset, offset + length]
+        else:
+            self.out_file.write(data)
+        self.count += 1
+        self.pos += length
+        return element_offset
 
+    def _flush_run(self):
+        if self._run is not None:
+            src, start, end = self._run
+            copy_range(src, self.out_file, start, end - start)
+            self._run = None
 
-def gen_compile_commands(cmd_file_search_path, out_dir):
+    def close(self):
+        self._flush_run()
+        self.out_file.write(b'\n]' if self.count else b'[]')
+        self.out_file.flush()
+
+
+class SortedSpill(object):
+    """Sorts (key, records) elements in bounded memory.
+
+    Elements are buffered as records until about buffer_size bytes are held,
+    then sorted, rendered and spilled to a temporary file as one run;
+    sorted_items() merges the runs.
+    """
+
+    # Rough per-record cost next to its two paths.
+    RECORD_SIZE = 64
+
+    def __init__(self, buffer_size, render):
+        self.buffer_size = buffer_size
+        self.render = render
+        self.buffer = []
+        self.buffered = 0
+        self.runs = []
+        self.run_files = []
+
+    def add(self, key, records):
+        self.buffer.append((key, records))
+        self.buffered += sum(len(output) + len(source) + self.RECORD_SIZE for _, output, source in records)
+        if self.buffered >= self.buffer_size:
+            self._spill()
+
+    def _spill(self):
+        self.buffer.sort(key=operator.itemgetter(0))
+        run_file = tempfile.TemporaryFile(prefix='compdb-run-')
+        self.run_files.append(run_file)
+        writer = JsonArrayWriter(run_file)
+        run = []
+        for key, records in self.buffer:
+            data = self.render(records)
+            run.append((key, None, run_file, writer.add(data), len(data)))
+        self.runs.append(run)
+        writer.close()
+        self.buffer = []
+        self.buffered = 0
+
+    def _rendered_buffer(self):
+        for key, records in self.buffer:
+            data = self.render(records)
+            yield key, data, None, 0, len(data)
+
+    def sorted_items(self):
+        """(key, data, file, offset, length) tuples in key order; data is None for spilled elements."""
+        self.buffer.sort(key=operator.itemgetter(0))
+        return heapq.merge(self._rendered_buffer(), *self.runs, key=operator.itemgetter(0))
+
+    def close(self):
+        for run_file in self.run_files:
+            run_file.close()
+
+
+def scan_dir(path):
+    """Return the *.o.cmd files in path with their stamps, and the subdirectories to scan next."""
+    found = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in PRUNE_DIRS or (entry.name == 'generated' and os.path.basename(path) == 'include'):
+                        continue
+                    subdirs.append(entry.path)
+                elif entry.name.endswith('.o.cmd'):
+                    st = entry.stat()
+                    found.append((entry.path, [st.st_mtime_ns, st.st_size]))
+    except OSError:
+        pass
+    return found, subdirs
+
+
+def discover_cmd_files(search_paths):
+    """Yield (path, stamp) for every *.o.cmd file under search_paths as directories get scanned."""
+    with ThreadPoolExecutor(max_workers=DISCOVERY_THREADS) as executor:
+        pending = set()
+        for search_path in search_paths:
+            if os.path.isdir(search_path):
+                pending.add(executor.submit(scan_dir, search_path))
+                continue
+            try:
+                yield search_path, file_stamp(search_path)
+            except OSError as e:
+                print("Skipping", search_path + ":", e, file=sys.stderr)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subdirs = future.result()
+                pending.update(executor.submit(scan_dir, subdir) for subdir in subdirs)
+                for item in found:
+                    yield item
+
+
+def sync_index(output_file, files, templates, changed, removed, base_stamp, index_meta):
+    """Update INDEX_FILE in place when it matches the output this run started from, else rebuild it."""
+    current = read_meta(INDEX_FILE)
+    if current is None or base_stamp is None or current.get('output') != json.dumps(base_stamp) or \
+            any(current.get(key) != value for key, value in index_meta.items()):
+        changed = None
+    elif not changed and not removed:
+        return
+    print("Updating", INDEX_FILE + "...", file=sys.stderr)
+    update_index(INDEX_FILE, templates, {cmd_file: entry[4] for cmd_file, entry in files.items()},
+                 changed, removed, dict(index_meta, output=json.dumps(file_stamp(output_file))))
+
+
+def write_template_file(out_file, out_dir, templates, files):
+    out_file.write(json.dumps({
+        'version': TEMPLATE_FORMAT,
+        'directory': out_dir,
+        'templates': templates,
+        'entries': [record for cmd_file in sorted(files) for record in files[cmd_file][4]],
+    }, separators=(',', ':')).encode('utf-8'))
+
+
+def expand_template_file(template_path, compact=False):
+    """Write COMPDB_FILE from a file written with --templates, one entry at a time."""
+    with open(template_path, 'r') as template_file:
+        factored = json.load(template_file)
+    if factored.get('version') != TEMPLATE_FORMAT:
+        print(template_path, "is not a template file this script can read", file=sys.stderr)
+        sys.exit(1)
+    renderer = EntryRenderer(factored['directory'], factored['templates'], compact)
+    tmp_path = COMPDB_FILE + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as out_file:
+            writer = JsonArrayWriter(out_file)
+            for record in factored['entries']:
+                writer.add(renderer.render([record]))
+            writer.close()
+        os.replace(tmp_path, COMPDB_FILE)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    print("Expanded {} entries of {} templates into {}".format(
+        len(factored['entries']), len(factored['templates']), COMPDB_FILE), file=sys.stderr)
+
+
+def gen_compile_commands(cmd_file_search_path, out_dir, rebuild=False, unsorted=False, compact=False,
+                         sort_buffer_mb=DEFAULT_SORT_BUFFER_MB, jobs=0, batch_size=0, include=None, exclude=None,
+                         ksu_only=False, index=False, templates=False):
     print("Building *.o.cmd file list...", file=sys.stderr)
 
+    jobs = jobs or multiprocessing.cpu_count()
+
     out_dir = os.path.abspath(out_dir)
 
+    if ksu_only:
+        include = [KSU_DRIVER_DIR + '/**'] + (include or [])
+        if not cmd_file_search_path:
+            # Objects of drivers/kernelsu are built below the same path of the out dir.
+            ksu_out_dir = os.path.join(out_dir, KSU_DRIVER_DIR)
+            if os.path.isdir(ksu_out_dir):
+                cmd_file_search_path = [ksu_out_dir]
+    scope = SourceScope(include, exclude, resolve_symlinks=ksu_only)
+    options = dict(scope.options, compact=compact, templates=templates)
+
     if not cmd_file_search_path:
         cmd_file_search_path = [out_dir]
 
-    cmd_files = []
-    for search_path in cmd_file_search_path:
-        if (os.path.isdir(search_path)):
-            for cur_dir, subdir, files in os.walk(search_path):
-                cmd_files.extend(os.path.join(cur_dir, cmdfile_name) for cmdfile_name in fnmatch.filter(files, '*.o.cmd'))
-        else:
-            cmd_files.extend(search_path)
+    output_file = TEMPLATE_FILE if templates else COMPDB_FILE
+    output_stamp = file_stamp(output_file) if os.path.exists(output_file) else None
+    cache = None if rebuild else load_cache(CACHE_FILE, out_dir, options, output_file, output_stamp)
+    cached_files = cache['files'] if cache else {}
+    table = TemplateTable(cache['templates'] if cache else None)
+    # Entries are only updated in place when they were parsed with the same options.
+    index_meta = {'out_dir': out_dir, 'options': json.dumps(options, sort_keys=True)}
+    base_stamp = output_stamp if cache else None
 
-    if not cmd_files:
-        print("No *.o.cmd files found in", ", ".join(cmd_file_search_path), file=sys.stderr)
-        return
+    # Per *.o.cmd file: [mtime, size, offset and length of its entries in COMPDB_FILE, records].
+    files = {}
+    stale = []
+
+    def classify(discovered):
+        for cmd_file, stamp in discovered:
+            if cmd_file in files:
+                continue
+            cached = cached_files.get(cmd_file)
+            if cached is not None and cached[:2] == stamp:
+                files[cmd_file] = cached
+            else:
+                files[cmd_file] = stamp + [0, 0, []]
+                stale.append(cmd_file)
+                yield cmd_file
 
-    print("Parsing *.o.cmd files...", file=sys.stderr)
+    parse = functools.partial(parse_batch, out_dir, scope)
+    stale_paths = classify(discover_cmd_files(cmd_file_search_path))
+    pool = None
+    removed = set()
+    if not cache:
+        print("Parsing *.o.cmd files...", file=sys.stderr)
+        batches = batched(stale_paths, batch_size or STREAMING_BATCH_SIZE)
+        if jobs == 1:
+            results = map(parse, batches)
+        else:
+            # Nothing to reuse: start the workers before the walk so they parse files as they
+            # are found (the pool forks now, before any discovery thread exists).
+            pool = multiprocessing.Pool(jobs)
+            results = pool.imap_unordered(parse, batches)
+    else:
+        for _ in stale_paths:
+            pass
+        removed = set(cached_files) - set(files)
+        if not files:
+            print("No *.o.cmd files found in", ", ".join(cmd_file_search_path), file=sys.stderr)
+            return
+        if not stale and not removed and (templates or unsorted or cache.get('sorted')):
+            print(output_file, "is up to date ({} *.o.cmd files)".format(len(files)), file=sys.stderr)
+            if index:
+                sync_index(output_file, files, table.templates, stale, removed, base_stamp, index_meta)
+            return
+        print("Parsing {} new or changed *.o.cmd files ({} removed, {} cached)...".format(
+            len(stale), len(removed), len(files) - len(stale)), file=sys.stderr)
+        batches = batched(stale, batch_size or adaptive_batch_size(len(stale), jobs))
+        if jobs == 1 or len(stale) < MIN_POOL_FILES:
+            results = map(parse, batches)
+        else:
+            pool = multiprocessing.Pool(jobs)
+            results = pool.imap_unordered(parse, batches)
 
     n_processed = 0
     print_progress_bar(0)
 
-    compdb = []
-    pool = multiprocessing.Pool()
+    tmp_path = output_file + '.tmp'
+    old_compdb = open(COMPDB_FILE, 'rb') if cache and not templates else None
+    renderer = EntryRenderer(out_dir, table.templates, compact)
+    spill = SortedSpill(sort_buffer_mb * 1024 * 1024, renderer.render)
     try:
-        for compdb_chunk in pool.imap_unordered(functools.partial(parse_cmd_file, out_dir), cmd_files, chunksize=int(math.sqrt(len(cmd_files)))):
-            compdb.extend(compdb_chunk)
-            n_processed += 1
-            print_progress_bar(n_processed / len(cmd_files))
+        with open(tmp_path, 'wb') as out_file:
+            writer = JsonArrayWriter(out_file)
+
+            def add(item):
+                cmd_file, data, src, offset, length = item
+                if not length:
+                    files[cmd_file][2:4] = [0, 0]
+                    return
+                files[cmd_file][2:4] = [writer.add(data, src or old_compdb, offset, length), length]
+
+            for batch in results:
+                for cmd_file, factored in batch:
+                    # Only the records are kept; entries are rendered when written.
+                    records = files[cmd_file][4] = table.records(factored)
+                    if templates:
+                        continue
+                    if unsorted:
+                        data = renderer.render(records)
+                        add((cmd_file, data, None, 0, len(data)))
+                    else:
+                        spill.add(cmd_file, records)
+                n_processed += len(batch)
+                print_progress_bar(n_processed / max(len(stale), 1))
+            print(file=sys.stderr)
+            if not files:
+                print("No *.o.cmd files found in", ", ".join(cmd_file_search_path), file=sys.stderr)
+                return
+
+            if templates:
+                template_list = table.compacted(entry[4] for entry in files.values())
+                write_template_file(out_file, out_dir, template_list, files)
+            else:
+                # Entries of unchanged files are copied from the previous compdb, in path order.
+                stale_set = set(stale)
+                cached_items = [
+                    (cmd_file, None, None, files[cmd_file][2], files[cmd_file][3])
+                    for cmd_file in sorted(files) if cmd_file not in stale_set
+                ]
+                if unsorted:
+                    for item in cached_items:
+                        add(item)
+                else:
+                    print("Merging compile_commands.json...", file=sys.stderr)
+                    for item in heapq.merge(cached_items, spill.sorted_items(), key=operator.itemgetter(0)):
+                        add(item)
+                writer.close()
+                template_list = table.compacted(entry[4] for entry in files.values())
+        os.replace(tmp_path, output_file)
 
     finally:
-        pool.terminate()
-        pool.join()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        spill.close()
+        if old_compdb is not None:
+            old_compdb.close()
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
 
-    print(file=sys.stderr)
-    print("Writing compile_commands.json...", file=sys.stderr)
+    tmp_path = CACHE_FILE + '.tmp'
+    with open(tmp_path, 'w') as cache_file:
+        # json.dumps, unlike json.dump, goes through the C encoder.
+        cache_file.write(json.dumps({
+            'version': CACHE_VERSION,
+            'out_dir': out_dir,
+            'options': options,
+            'sorted': not unsorted,
+            'output': file_stamp(output_file),
+            'templates': template_list,
+            'files': files,
+        }))
+    os.replace(tmp_path, CACHE_FILE)
 
-    with open('compile_commands.json', 'w') as compdb_file:
-        json.dump(compdb, compdb_file, indent=1)
+    if index:
+        sync_index(output_file, files, template_list, stale, removed, base_stamp, index_meta)
 
 
 def main():
     cmd_parser = argparse.ArgumentParser()
     cmd_parser.add_argument('-O', '--out-dir', type=str, default=os.getcwd(), help="Build output directory")
+    cmd_parser.add_argument('--rebuild', action='store_true', help="Ignore " + CACHE_FILE + " and re-parse every *.o.cmd file")
+    cmd_parser.add_argument('--unsorted', action='store_true', help="Write entries as they are parsed; faster, but the order varies between runs")
+    cmd_parser.add_argument('--compact', action='store_true', help="Write one unindented entry per line")
+    cmd_parser.add_argument('--sort-buffer-mb', type=int, default=DEFAULT_SORT_BUFFER_MB,
+                            help="Memory for sorting entries before spilling to temporary files (default: {})".format(DEFAULT_SORT_BUFFER_MB))
+    cmd_parser.add_argument('-j', '--jobs', type=int, default=0,
+                            help="Parser processes; 1 parses in this process (default: one per CPU)")
+    cmd_parser.add_argument('--batch-size', type=int, default=0,
+                            help="*.o.cmd files per worker task (default: sized from the number of files and jobs)")
+    cmd_parser.add_argument('--include', action='append', metavar='GLOB',
+                            help="Only keep entries whose source_ path matches GLOB; may be repeated")
+    cmd_parser.add_argument('--exclude', action='append', metavar='GLOB',
+                            help="Drop entries whose source_ path matches GLOB; may be repeated")
+    cmd_parser.add_argument('--ksu-only', action='store_true',
+                            help="Only " + KSU_DRIVER_DIR + ", with paths resolved through its symlink to KernelSU's kernel/")
+    cmd_parser.add_argument('--index', action='store_true',
+                            help="Also keep " + INDEX_FILE + " up to date, for compdb_index.py query/serve")
+    cmd_parser.add_argument('--templates', action='store_true',
+                            help="Write " + TEMPLATE_FILE + ", shared command templates plus per-file paths, instead of " + COMPDB_FILE)
+    cmd_parser.add_argument('--expand', metavar='TEMPLATE_FILE',
+                            help="Only write " + COMPDB_FILE + " from a file written with --templates")
     cmd_parser.add_argument('cmd_file_search_path', nargs='*', help="*.cmd file search path")
-    gen_compile_commands(**vars(cmd_parser.parse_args()))
+    args = cmd_parser.parse_args()
+    if args.jobs < 0 or args.batch_size < 0:
+        cmd_parser.error("--jobs and --batch-size must not be negative")
+    expand = vars(args).pop('expand')
+    if expand:
+        expand_template_file(expand, args.compact)
+        return
+    gen_compile_commands(**vars(args))
 
 
 if __name__ == '__main__':
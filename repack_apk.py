@@ -1,14 +1,28 @@
 import argparse
+import errno
+import functools
+import hashlib
 import json
+import mmap
 import os
 import re
 import shutil
+import stat
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
-from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar, Union
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from scripts.android_toolchain import ToolchainIndex
 
 
 def workspace_root() -> Path:
@@ -43,6 +57,7 @@ def merge_config(file_cfg: dict, args: argparse.Namespace) -> dict:
         "arch": [],
         "output_name": "",
         "strip": False,
+        "variants": [],
     }
 
     cfg.update({k: v for k, v in file_cfg.items() if k != "signing"})
@@ -71,6 +86,31 @@ def merge_config(file_cfg: dict, args: argparse.Namespace) -> dict:
         cfg["signing"]["key_pass"] = args.key_pass
 
     cfg["arch"] = normalize_arch_values(cfg.get("arch", []))
+
+    variants = cfg.pop("variants", None) or []
+    if not isinstance(variants, list):
+        raise ValueError("Config 'variants' must be an array")
+    cfg["variants"] = [merge_variant(cfg, variant) for variant in variants]
+    names = [variant["output_name"] for variant in cfg["variants"]]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError("Duplicate variant output_name: " + ", ".join(duplicates))
+    return cfg
+
+
+def merge_variant(base: dict, variant: object) -> dict:
+    """Overlay one 'variants' entry on the merged top-level config."""
+    if not isinstance(variant, dict):
+        raise ValueError("Each entry in 'variants' must be an object")
+    cfg = {k: v for k, v in base.items() if k != "variants"}
+    cfg["signing"] = dict(base["signing"])
+    cfg.update({k: v for k, v in variant.items() if k not in ("signing", "variants")})
+    variant_signing = variant.get("signing", {})
+    if isinstance(variant_signing, dict):
+        cfg["signing"].update(variant_signing)
+    cfg["arch"] = normalize_arch_values(cfg.get("arch", []))
+    if not str(cfg.get("output_name", "")).strip():
+        raise ValueError("Each entry in 'variants' needs an output_name")
     return cfg
 
 
@@ -91,31 +131,24 @@ def version_key(version: str) -> Tuple[int, ...]:
     return tuple(int(n) for n in nums) if nums else (0,)
 
 
-def find_strip_tool() -> Optional[Path]:
+def find_strip_tool(index: Optional[ToolchainIndex] = None) -> Optional[Path]:
     """Locate llvm-strip (preferred) or strip from the Android NDK toolchain."""
+    index = index or ToolchainIndex()
     ndk_root = os.environ.get("ANDROID_NDK_HOME") or os.environ.get("ANDROID_NDK")
     if not ndk_root:
         sdk_root = os.environ.get("ANDROID_SDK_ROOT") or os.environ.get("ANDROID_HOME")
         if sdk_root:
-            ndk_dir = Path(sdk_root) / "ndk"
-            if ndk_dir.exists():
-                versions = sorted(
-                    [d for d in ndk_dir.iterdir() if d.is_dir()],
-                    key=lambda d: version_key(d.name),
-                    reverse=True,
-                )
-                if versions:
-                    ndk_root = str(versions[0])
+            versions = sorted(index.sdk(Path(sdk_root))["ndk_versions"], key=version_key, reverse=True)
+            if versions:
+                ndk_root = str(Path(sdk_root) / "ndk" / versions[0])
 
     if ndk_root:
-        toolchain_bin = Path(ndk_root) / "toolchains" / "llvm" / "prebuilt"
-        if toolchain_bin.exists():
-            for prebuilt in toolchain_bin.iterdir():
-                bin_dir = prebuilt / "bin"
+        ndk = index.ndk(Path(ndk_root))
+        if ndk is not None:
+            for host_tag, bin_names in ndk["host_tags"].items():
                 for name in ("llvm-strip", "llvm-strip.exe", "strip", "strip.exe"):
-                    candidate = bin_dir / name
-                    if candidate.exists():
-                        return candidate
+                    if name in bin_names:
+                        return Path(ndk_root) / "toolchains" / "llvm" / "prebuilt" / host_tag / "bin" / name
 
     # Fall back to PATH.
     for name in ("llvm-strip", "strip"):
@@ -125,7 +158,7 @@ def find_strip_tool() -> Optional[Path]:
     return None
 
 
-def find_android_tool(tool_base_name: str) -> Optional[Path]:
+def find_android_tool(tool_base_name: str, index: Optional[ToolchainIndex] = None) -> Optional[Path]:
     direct = shutil.which(tool_base_name)
     if direct:
         return Path(direct)
@@ -138,18 +171,12 @@ def find_android_tool(tool_base_name: str) -> Optional[Path]:
     if not sdk_root:
         return None
 
-    build_tools = Path(sdk_root) / "build-tools"
-    if not build_tools.exists():
-        return None
-
+    build_tools = (index or ToolchainIndex()).sdk(Path(sdk_root))["build_tools"]
     candidates: List[Tuple[Tuple[int, ...], Path]] = []
-    for version_dir in build_tools.iterdir():
-        if not version_dir.is_dir():
-            continue
+    for version, file_names in build_tools.items():
         for name in executable_names:
-            candidate = version_dir / name
-            if candidate.exists():
-                candidates.append((version_key(version_dir.name), candidate))
+            if name in file_names:
+                candidates.append((version_key(version), Path(sdk_root) / "build-tools" / version / name))
 
     if not candidates:
         return None
@@ -201,97 +228,804 @@ def find_ksud_binaries_by_arch(ksud_build_type: str, arch_filters: List[str]) ->
     return result
 
 
-def collect_existing_arches(apk_path: Path) -> List[str]:
-    arches = []
-    seen = set()
-    with ZipFile(apk_path, "r") as zin:
-        for name in zin.namelist():
-            if not name.startswith("lib/"):
+def lib_entry_arch(name: str) -> Optional[str]:
+    """Return <arch> for lib/<arch>/<file> entry names, otherwise None."""
+    if not name.startswith("lib/"):
+        return None
+    parts = name.split("/")
+    if len(parts) >= 3 and parts[1]:
+        return parts[1]
+    return None
+
+
+class ApkIndex:
+    """Central directory of one APK, parsed once and shared by every helper.
+
+    Holds the ZipInfo entries (offsets, compression types, sizes) plus the
+    native library layout per arch. Outputs are indexed from the entries the
+    writer just emitted instead of reading the file back.
+    """
+
+    def __init__(self, entries: List[ZipInfo]):
+        self.entries = entries
+        self.by_name: Dict[str, ZipInfo] = {}
+        self.arch_of: Dict[str, str] = {}
+        self.libs_by_arch: Dict[str, List[str]] = {}
+        for info in entries:
+            self.by_name[info.filename] = info
+            arch = lib_entry_arch(info.filename)
+            if arch is None:
                 continue
-            parts = name.split("/")
-            if len(parts) >= 3 and parts[1] and parts[1] not in seen:
-                seen.add(parts[1])
-                arches.append(parts[1])
-    return arches
+            self.arch_of[info.filename] = arch
+            self.libs_by_arch.setdefault(arch, []).append(info.filename.split("/", 2)[2])
 
+    @classmethod
+    def from_file(cls, apk_path: Path) -> "ApkIndex":
+        with ZipFile(apk_path, "r") as zin:
+            return cls(zin.infolist())
 
-def collect_existing_ksud_arches(apk_path: Path) -> List[str]:
-    arches = []
-    seen = set()
-    with ZipFile(apk_path, "r") as zin:
-        for name in zin.namelist():
-            if not (name.startswith("lib/") and name.endswith("/libksud.so")):
+    @property
+    def arches(self) -> List[str]:
+        return list(self.libs_by_arch)
+
+    def has_lib(self, arch: str, lib_name: str) -> bool:
+        return f"lib/{arch}/{lib_name}" in self.by_name
+
+    def arches_with_lib(self, lib_name: str) -> List[str]:
+        return [arch for arch, libs in self.libs_by_arch.items() if lib_name in libs]
+
+
+def collect_existing_arches(apk_path: Path, index: Optional[ApkIndex] = None) -> List[str]:
+    return (index or ApkIndex.from_file(apk_path)).arches
+
+
+def collect_existing_ksud_arches(apk_path: Path, index: Optional[ApkIndex] = None) -> List[str]:
+    return (index or ApkIndex.from_file(apk_path)).arches_with_lib("libksud.so")
+
+
+@dataclass
+class PhaseRecord:
+    name: str
+    start: float = 0.0
+    wall: float = 0.0
+    cpu: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    thread: int = 0
+
+
+def children_cpu_time() -> float:
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class Timings:
+    """Wall time, CPU time and I/O bytes per pipeline phase.
+
+    CPU time is the calling thread's time plus any child processes (strip,
+    apksigner) reaped meanwhile; concurrent phases may share child time.
+    """
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.records: List[PhaseRecord] = []
+        self._lock = threading.Lock()
+        self._threads: Dict[int, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseRecord]:
+        record = PhaseRecord(name)
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time() + children_cpu_time()
+        try:
+            yield record
+        finally:
+            record.start = start_wall - self.origin
+            record.wall = time.perf_counter() - start_wall
+            record.cpu = time.thread_time() + children_cpu_time() - start_cpu
+            with self._lock:
+                record.thread = self._threads.setdefault(threading.get_ident(), len(self._threads) + 1)
+                self.records.append(record)
+
+    def table_lines(self) -> List[str]:
+        records = sorted(self.records, key=lambda r: r.start)
+        width = max([len("Phase")] + [len(r.name) for r in records])
+        lines = [f"{'Phase':<{width}}  {'Wall(s)':>8}  {'CPU(s)':>8}  {'Read(MB)':>9}  {'Write(MB)':>9}"]
+        for r in records:
+            lines.append(
+                f"{r.name:<{width}}  {r.wall:>8.3f}  {r.cpu:>8.3f}  "
+                f"{r.bytes_read / (1024 * 1024):>9.2f}  {r.bytes_written / (1024 * 1024):>9.2f}"
+            )
+        return lines
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Trace-event JSON that chrome://tracing and Perfetto can load."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": r.name,
+                "cat": "repack",
+                "ph": "X",
+                "ts": round(r.start * 1e6),
+                "dur": round(r.wall * 1e6),
+                "pid": pid,
+                "tid": r.thread,
+                "args": {"cpu_s": round(r.cpu, 6), "bytes_read": r.bytes_read, "bytes_written": r.bytes_written},
+            }
+            for r in sorted(self.records, key=lambda r: r.start)
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+DEFAULT_STRIP_CACHE_MAX_MB = 256
+
+
+def default_strip_cache_dir() -> Path:
+    return workspace_root() / "dist" / ".cache" / "strip"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=256)
+def _sha256_for_stat(path: str, size: int, mtime_ns: int) -> str:
+    return file_sha256(Path(path))
+
+
+def cached_file_sha256(path: Path) -> str:
+    """file_sha256() memoized on (path, size, mtime) so repeated lookups in one run hash once."""
+    st = path.stat()
+    return _sha256_for_stat(str(path.resolve()), st.st_size, st.st_mtime_ns)
+
+
+def _read_umask() -> int:
+    # The umask can only be read by setting it, which would affect files other threads create
+    # meanwhile; this runs once at import, before any threads exist.
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _read_umask()
+
+
+def new_file_mode(path: Path) -> int:
+    """Mode open() would give path: the existing file's, or 0o666 less the umask."""
+    try:
+        return stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_output(path: Path) -> Iterator[BinaryIO]:
+    """Yield a temporary file that replaces path once the block completes.
+
+    mkstemp() creates the file 0600, so it gets new_file_mode(path) before the
+    rename; on error it is removed and path is left alone.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            os.fchmod(f.fileno(), new_file_mode(path))
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def copy_file_atomic(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fsrc, atomic_output(dst) as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+
+
+def iter_file_chunks(path: Path, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """Yield a file's contents in fixed-size chunks through a read-only mmap."""
+    chunk_size = chunk_size or COPY_CHUNK_SIZE
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            can_advise = hasattr(mm, "madvise") and chunk_size % mmap.PAGESIZE == 0
+            if can_advise and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            for pos in range(0, len(mm), chunk_size):
+                yield mm[pos : pos + chunk_size]
+                # Drop consumed pages from our RSS; they are still in the page cache.
+                if can_advise and hasattr(mmap, "MADV_DONTNEED"):
+                    mm.madvise(mmap.MADV_DONTNEED, pos, min(chunk_size, len(mm) - pos))
+
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    with atomic_output(path) as f:
+        f.write(data)
+
+
+class StripCache:
+    """Content-addressed cache of stripped binaries with LRU eviction.
+
+    Entries are keyed by the input's SHA-256 plus the strip tool path and
+    version; file mtimes are bumped on every hit and serve as the LRU clock.
+    """
+
+    ENTRY_SUFFIX = ".bin"
+    TOOLS_FILE = "tools.json"
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_STRIP_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._tool_ids: Dict[str, str] = {}
+
+    def tool_identity(self, strip_tool: Path) -> str:
+        """Return "<path>\0<version>", running --version only when the tool binary changed."""
+        tool = str(strip_tool.absolute())
+        with self._lock:
+            cached = self._tool_ids.get(tool)
+            if cached is not None:
+                return cached
+            st = strip_tool.stat()
+            tools_path = self.root / self.TOOLS_FILE
+            try:
+                tools = json.loads(tools_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                tools = {}
+            record = tools.get(tool)
+            if not (
+                isinstance(record, dict)
+                and record.get("mtime_ns") == st.st_mtime_ns
+                and record.get("size") == st.st_size
+            ):
+                proc = subprocess.run(
+                    [tool, "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+                )
+                version = " ".join(proc.stdout.split())
+                record = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "version": version}
+                tools[tool] = record
+                self.root.mkdir(parents=True, exist_ok=True)
+                write_bytes_atomic(tools_path, json.dumps(tools, indent=2).encode("utf-8"))
+            identity = f"{tool}\0{record['version']}"
+            self._tool_ids[tool] = identity
+            return identity
+
+    def key(self, src: Path, strip_tool: Path) -> str:
+        digest = hashlib.sha256()
+        digest.update(cached_file_sha256(src).encode("ascii"))
+        digest.update(b"\0")
+        digest.update(self.tool_identity(strip_tool).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str, dst: Path) -> bool:
+        """Materialize a cached entry at dst (hard link when possible); False on a miss."""
+        path = self.root / (key + self.ENTRY_SUFFIX)
+        try:
+            os.utime(path)
+            try:
+                os.link(path, dst)
+            except OSError:
+                shutil.copyfile(path, dst)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, src: Path) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        copy_file_atomic(src, self.root / (key + self.ENTRY_SUFFIX))
+        self.prune()
+
+    def entries(self) -> List[Tuple[Path, os.stat_result]]:
+        if not self.root.is_dir():
+            return []
+        out = []
+        for path in self.root.iterdir():
+            if path.suffix != self.ENTRY_SUFFIX:
                 continue
-            parts = name.split("/")
-            if len(parts) >= 3 and parts[1] and parts[1] not in seen:
-                seen.add(parts[1])
-                arches.append(parts[1])
-    return arches
+            try:
+                out.append((path, path.stat()))
+            except OSError:
+                continue
+        return out
+
+    def stats(self) -> Tuple[int, int]:
+        entries = self.entries()
+        return len(entries), sum(st.st_size for _, st in entries)
+
+    def prune(self, max_bytes: Optional[int] = None) -> Tuple[int, int]:
+        """Evict least recently used entries until the cache fits; returns (count, bytes) removed."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries(), key=lambda e: e[1].st_mtime_ns)
+        total = sum(st.st_size for _, st in entries)
+        removed = removed_bytes = 0
+        for path, st in entries:
+            if total <= limit:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= st.st_size
+            removed += 1
+            removed_bytes += st.st_size
+        return removed, removed_bytes
+
+
+def strip_binary(src: Path, strip_tool: Path, dst: Path, cache: Optional[StripCache] = None) -> Path:
+    """Write the stripped binary to dst (from the cache when possible) and return dst."""
+    key = None
+    if cache is not None:
+        key = cache.key(src, strip_tool)
+        if cache.get(key, dst):
+            return dst
+    run_cmd([str(strip_tool), "--strip-all", "-o", str(dst), str(src)], "strip failed")
+    if cache is not None and key is not None:
+        cache.put(key, dst)
+    return dst
+
+
+def load_ksud_binary(
+    arch: str,
+    src: Path,
+    strip_tool: Optional[Path],
+    tmp_dir: Path,
+    strip_cache: Optional[StripCache] = None,
+    timings: Optional[Timings] = None,
+) -> Tuple[Path, float]:
+    """Strip one arch's ksud when a strip tool is given; returns the file to pack and elapsed seconds.
+
+    Binaries stay on disk and are streamed into the APK, so memory does not grow
+    with their size or with the number of arches.
+    """
+    timings = timings or Timings()
+    with timings.phase(f"{'strip' if strip_tool is not None else 'load'} {arch}") as record:
+        if strip_tool is not None:
+            path = strip_binary(src, strip_tool, tmp_dir / f"{arch}-{src.name}", strip_cache)
+        else:
+            path = src
+        record.bytes_read = src.stat().st_size
+        if path != src:
+            record.bytes_written = path.stat().st_size
+    return path, record.wall
+
+
+def resolve_jobs(jobs: int, task_count: int) -> int:
+    if jobs > 0:
+        return jobs
+    return max(1, min(task_count, os.cpu_count() or 1))
+
+
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+ZIP_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+ZIP_END_RECORD = struct.Struct("<4s4H2LH")
+ZIP_LOCAL_SIG = b"PK\x03\x04"
+LOCAL_HEADER_CRC_OFFSET = 14
+ZIP_CENTRAL_SIG = b"PK\x01\x02"
+ZIP_END_SIG = b"PK\x05\x06"
+ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+ZIP_FLAG_UTF8 = 0x800
+ZIP32_LIMIT = 0xFFFFFFFF
+COPY_CHUNK_SIZE = 1 << 20
+# Extra field used by zipalign/apksigner to pad local headers up to the data alignment.
+ALIGNMENT_EXTRA_ID = 0xD935
+ALIGNMENT_EXTRA_MIN_SIZE = 6
+DEFAULT_ALIGNMENT = 4
+SO_PAGE_ALIGNMENT = 16 * 1024
+
+
+def dos_datetime(date_time: Tuple[int, int, int, int, int, int]) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | (second // 2)
+    return dos_time, dos_date
+
+
+def strip_alignment_extra(extra: bytes) -> Optional[bytes]:
+    """Drop existing alignment padding from a local extra field; None if it cannot be parsed."""
+    out = bytearray()
+    pos = 0
+    while pos < len(extra):
+        if pos + 4 > len(extra):
+            return None
+        header_id, size = struct.unpack_from("<2H", extra, pos)
+        end = pos + 4 + size
+        if end > len(extra):
+            return None
+        if header_id != ALIGNMENT_EXTRA_ID:
+            out += extra[pos:end]
+        pos = end
+    return bytes(out)
+
+
+def encode_entry_name(info: ZipInfo) -> bytes:
+    if info.flag_bits & ZIP_FLAG_UTF8:
+        return info.filename.encode("utf-8")
+    try:
+        return info.filename.encode("ascii")
+    except UnicodeEncodeError:
+        info.flag_bits |= ZIP_FLAG_UTF8
+        return info.filename.encode("utf-8")
+
+
+class ApkZipWriter:
+    """Minimal ZIP writer that copies untouched entries verbatim from the input APK.
+
+    Raw-copied entries keep their compressed bytes, CRC and sizes; only entries
+    added through write_bytes() go through zlib. STORED entries are aligned as
+    they are written, the same way `zipalign -P 16 4` would lay them out.
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        alignment: int = DEFAULT_ALIGNMENT,
+        so_alignment: int = SO_PAGE_ALIGNMENT,
+    ):
+        self.fp = fp
+        self.alignment = alignment
+        self.so_alignment = so_alignment
+        self.entries: List[ZipInfo] = []
+        self.start_offset = fp.tell()
+        self.bytes_read = 0
+
+    def entry_alignment(self, info: ZipInfo) -> int:
+        if info.compress_type != ZIP_STORED:
+            return 1
+        if info.filename.endswith(".so"):
+            return self.so_alignment
+        return self.alignment
+
+    def _align_extra(self, info: ZipInfo, name: bytes, extra: bytes) -> bytes:
+        alignment = self.entry_alignment(info)
+        if alignment <= 1:
+            return extra
+        data_offset = self.fp.tell() + ZIP_LOCAL_HEADER.size + len(name)
+        base = strip_alignment_extra(extra)
+        if base is None:
+            # Unparseable extra field: pad with zeros like zipalign does.
+            pad = -(data_offset + len(extra)) % alignment
+            return extra + b"\0" * pad
+        pad = -(data_offset + len(base) + ALIGNMENT_EXTRA_MIN_SIZE) % alignment
+        field = struct.pack("<3H", ALIGNMENT_EXTRA_ID, 2 + pad, alignment) + b"\0" * pad
+        return base + field
+
+    def _write_local_header(self, info: ZipInfo, name: bytes, extra: bytes) -> None:
+        if info.compress_size > ZIP32_LIMIT or info.file_size > ZIP32_LIMIT or self.fp.tell() > ZIP32_LIMIT:
+            raise RuntimeError(f"ZIP64 entries are not supported: {info.filename}")
+        extra = self._align_extra(info, name, extra)
+        if len(extra) > 0xFFFF:
+            raise RuntimeError(f"Extra field too large after alignment: {info.filename}")
+        dos_time, dos_date = dos_datetime(info.date_time)
+        info.header_offset = self.fp.tell()
+        self.fp.write(
+            ZIP_LOCAL_HEADER.pack(
+                ZIP_LOCAL_SIG,
+                info.extract_version,
+                info.flag_bits,
+                info.compress_type,
+                dos_time,
+                dos_date,
+                info.CRC,
+                info.compress_size,
+                info.file_size,
+                len(name),
+                len(extra),
+            )
+        )
+        self.fp.write(name)
+        self.fp.write(extra)
+
+    def copy_raw(self, src: BinaryIO, info: ZipInfo) -> None:
+        """Copy an entry's compressed payload from src without recompressing it."""
+        src.seek(info.header_offset)
+        header = src.read(ZIP_LOCAL_HEADER.size)
+        if len(header) != ZIP_LOCAL_HEADER.size or header[:4] != ZIP_LOCAL_SIG:
+            raise RuntimeError(f"Bad local file header for entry: {info.filename}")
+        fields = ZIP_LOCAL_HEADER.unpack(header)
+        name_len, extra_len = fields[9], fields[10]
+        src.seek(name_len, os.SEEK_CUR)
+        local_extra = src.read(extra_len)
+
+        out = ZipInfo(filename=info.filename, date_time=info.date_time)
+        out.compress_type = info.compress_type
+        out.external_attr = info.external_attr
+        out.internal_attr = info.internal_attr
+        out.comment = info.comment
+        out.create_system = info.create_system
+        out.create_version = info.create_version
+        out.extract_version = info.extract_version
+        out.extra = info.extra
+        # Sizes are known up front, so the data descriptor is not carried over.
+        out.flag_bits = info.flag_bits & ~ZIP_FLAG_DATA_DESCRIPTOR
+        out.CRC = info.CRC
+        out.compress_size = info.compress_size
+        out.file_size = info.file_size
+
+        name = encode_entry_name(out)
+        self._write_local_header(out, name, local_extra)
+        self.bytes_read += ZIP_LOCAL_HEADER.size + name_len + extra_len + info.compress_size
+        remaining = info.compress_size
+        while remaining > 0:
+            chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise RuntimeError(f"Truncated entry data: {info.filename}")
+            self.fp.write(chunk)
+            remaining -= len(chunk)
+        self.entries.append(out)
+
+    def write_chunks(self, info: ZipInfo, chunks: Iterable[bytes]) -> None:
+        """Add a new entry from a stream of chunks, compressing it when it is ZIP_DEFLATED.
+
+        CRC and sizes are unknown until the data has been written, so the local
+        header is written with zeros and patched afterwards.
+        """
+        compressor = None
+        if info.compress_type == ZIP_DEFLATED:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            info.extract_version = max(info.extract_version, 20)
+        elif info.compress_type != ZIP_STORED:
+            raise RuntimeError(f"Unsupported compression type {info.compress_type} for {info.filename}")
+        info.flag_bits &= ~ZIP_FLAG_DATA_DESCRIPTOR
+        info.CRC = info.file_size = info.compress_size = 0
+
+        name = encode_entry_name(info)
+        self._write_local_header(info, name, info.extra)
+        crc = file_size = compress_size = 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            payload = compressor.compress(chunk) if compressor is not None else chunk
+            self.fp.write(payload)
+            compress_size += len(payload)
+        if compressor is not None:
+            payload = compressor.flush()
+            self.fp.write(payload)
+            compress_size += len(payload)
+        if file_size > ZIP32_LIMIT or compress_size > ZIP32_LIMIT:
+            raise RuntimeError(f"ZIP64 entries are not supported: {info.filename}")
+
+        self.bytes_read += file_size
+        info.CRC = crc & 0xFFFFFFFF
+        info.file_size = file_size
+        info.compress_size = compress_size
+        end = self.fp.tell()
+        self.fp.seek(info.header_offset + LOCAL_HEADER_CRC_OFFSET)
+        self.fp.write(struct.pack("<3L", info.CRC, info.compress_size, info.file_size))
+        self.fp.seek(end)
+        self.entries.append(info)
+
+    def write_bytes(self, info: ZipInfo, data: bytes) -> None:
+        self.write_chunks(info, [data])
+
+    def write_file(self, info: ZipInfo, path: Path) -> None:
+        self.write_chunks(info, iter_file_chunks(path))
+
+    @property
+    def bytes_written(self) -> int:
+        return self.fp.tell() - self.start_offset
+
+    def close(self) -> "ApkIndex":
+        """Write the central directory and return the index of what was written."""
+        if len(self.entries) > 0xFFFF:
+            raise RuntimeError("ZIP64 archives are not supported: too many entries")
+        cd_offset = self.fp.tell()
+        for info in self.entries:
+            dos_time, dos_date = dos_datetime(info.date_time)
+            name = encode_entry_name(info)
+            self.fp.write(
+                ZIP_CENTRAL_HEADER.pack(
+                    ZIP_CENTRAL_SIG,
+                    info.create_version | (info.create_system << 8),
+                    info.extract_version,
+                    info.flag_bits,
+                    info.compress_type,
+                    dos_time,
+                    dos_date,
+                    info.CRC,
+                    info.compress_size,
+                    info.file_size,
+                    len(name),
+                    len(info.extra),
+                    len(info.comment),
+                    0,
+                    info.internal_attr,
+                    info.external_attr,
+                    info.header_offset,
+                )
+            )
+            self.fp.write(name)
+            self.fp.write(info.extra)
+            self.fp.write(info.comment)
+        cd_size = self.fp.tell() - cd_offset
+        if cd_offset > ZIP32_LIMIT or cd_size > ZIP32_LIMIT:
+            raise RuntimeError("ZIP64 archives are not supported: central directory too large")
+        count = len(self.entries)
+        self.fp.write(ZIP_END_RECORD.pack(ZIP_END_SIG, 0, 0, count, count, cd_size, cd_offset, 0))
+        return ApkIndex(self.entries)
+
+
+class KsudLoader:
+    """Strips/loads ksud binaries on a bounded thread pool.
+
+    Loads are shared by (binary, strip tool), so variants built from the same
+    ksud strip it once; a binary that changed on disk since it was loaded is
+    loaded again. With jobs == 1 every load runs serially in submit().
+    """
+
+    def __init__(
+        self, jobs: int = 0, strip_cache: Optional[StripCache] = None, timings: Optional[Timings] = None
+    ):
+        self.jobs = jobs
+        self.strip_cache = strip_cache
+        self.timings = timings or Timings()
+        self._tmp = tempfile.TemporaryDirectory()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loads: Dict[Tuple[Path, Optional[Path]], Tuple[Tuple[int, int], Path, "Future[Tuple[Path, float]]"]] = {}
+        self._work_dirs = 0
+        self._lock = threading.Lock()
+
+    def submit(self, arch: str, src: Path, strip_tool: Optional[Path]) -> "Future[Tuple[Path, float]]":
+        key = (src.resolve(), strip_tool)
+        st = src.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            previous = self._loads.get(key)
+            if previous is not None:
+                if previous[0] == stamp:
+                    return previous[2]
+                if previous[2].done():
+                    # Superseded by a rebuilt binary; only long-lived runs (watch) get here.
+                    shutil.rmtree(previous[1], ignore_errors=True)
+            self._work_dirs += 1
+            work_dir = Path(self._tmp.name) / str(self._work_dirs)
+            work_dir.mkdir()
+            if self.jobs != 1:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=resolve_jobs(self.jobs, len(ARCH_TO_TRIPLE)))
+                load = self._executor.submit(
+                    load_ksud_binary, arch, src, strip_tool, work_dir, self.strip_cache, self.timings
+                )
+                self._loads[key] = (stamp, work_dir, load)
+                return load
+            load = Future()
+            self._loads[key] = (stamp, work_dir, load)
+        # Serial mode: run outside the lock so other callers only wait on this one load.
+        try:
+            load.set_result(load_ksud_binary(arch, src, strip_tool, work_dir, self.strip_cache, self.timings))
+        except BaseException as exc:
+            load.set_exception(exc)
+        return load
+
+    def submit_all(
+        self, ksud_by_arch: Dict[str, Path], strip_tool: Optional[Path]
+    ) -> Dict[str, "Future[Tuple[Path, float]]"]:
+        return {arch: self.submit(arch, path, strip_tool) for arch, path in ksud_by_arch.items()}
 
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self._tmp.cleanup()
 
-def strip_binary(src: Path, strip_tool: Path, tmp_dir: Path) -> bytes:
-    dst = tmp_dir / src.name
-    shutil.copy2(src, dst)
-    run_cmd([str(strip_tool), "--strip-all", str(dst)], "strip failed")
-    return dst.read_bytes()
+    def __enter__(self) -> "KsudLoader":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def append_ksud_entries(
+    zout: ApkZipWriter,
+    arch_filters: List[str],
+    loads: Dict[str, "Future[Tuple[Path, float]]"],
+    strip_tool: Optional[Path],
+) -> None:
+    for arch in arch_filters:
+        load = loads.get(arch)
+        if load is None:
+            continue
+        ksud_path, elapsed = load.result()
+        action = "stripped" if strip_tool is not None else "loaded"
+        print(f"[INFO] ksud {arch}: {action} {ksud_path.stat().st_size} bytes in {elapsed:.2f}s")
+        lib_path = f"lib/{arch}/libksud.so"
+        entry = ZipInfo(filename=lib_path)
+        entry.compress_type = ZIP_DEFLATED
+        zout.write_file(entry, ksud_path)
 
 
 def repack_apk(
     apk_path: Path,
-    out_unsigned_path: Path,
+    out_path: Path,
     arch_filters: List[str],
     ksud_by_arch: Dict[str, Path],
     strip_tool: Optional[Path] = None,
-) -> None:
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        ksud_bytes_by_arch: Dict[str, bytes] = {}
-        for arch, ksud_path in ksud_by_arch.items():
-            if strip_tool is not None:
-                ksud_bytes_by_arch[arch] = strip_binary(ksud_path, strip_tool, Path(tmp_dir))
-            else:
-                ksud_bytes_by_arch[arch] = ksud_path.read_bytes()
-
-        with ZipFile(apk_path, "r") as zin, ZipFile(out_unsigned_path, "w") as zout:
-            for info in zin.infolist():
-                name = info.filename
-
-                if name.startswith("lib/") and arch_filters:
-                    parts = name.split("/")
-                    if len(parts) >= 3 and parts[1] not in arch_filters:
+    jobs: int = 0,
+    strip_cache: Optional[StripCache] = None,
+    loader: Optional[KsudLoader] = None,
+    index: Optional[ApkIndex] = None,
+    timings: Optional[Timings] = None,
+) -> Tuple[int, ApkIndex]:
+    """Write the repacked APK; returns where the injected libksud.so entries start and the output index.
+
+    Injected entries always come last, so a later patch_ksud_entries() call can
+    replace them by rewriting only the tail of the file. A shared loader and the
+    input's index can be passed in when building several variants.
+    """
+    with ExitStack() as stack:
+        if loader is None:
+            loader = stack.enter_context(KsudLoader(jobs, strip_cache))
+        # Loads run on the pool while the input APK entries are copied.
+        loads = loader.submit_all(ksud_by_arch, strip_tool)
+        record = stack.enter_context((timings or Timings()).phase(f"zip rewrite {out_path.name}"))
+        with open(apk_path, "rb") as src, open(out_path, "wb") as fout:
+            if index is None:
+                with ZipFile(src, "r") as zin:
+                    index = ApkIndex(zin.infolist())
+            zout = ApkZipWriter(fout)
+            for info in index.entries:
+                arch = index.arch_of.get(info.filename)
+                if arch is not None:
+                    if arch_filters and arch not in arch_filters:
                         continue
-
-                # Drop original libksud.so only for arches that have a replacement binary.
-                if name.startswith("lib/") and name.endswith("/libksud.so"):
-                    parts = name.split("/")
-                    if len(parts) >= 3 and parts[1] in ksud_bytes_by_arch:
+                    # Drop original libksud.so only for arches that have a replacement binary.
+                    if info.filename.endswith("/libksud.so") and arch in loads:
                         continue
 
-                data = zin.read(name)
-                new_info = ZipInfo(filename=name, date_time=info.date_time)
-                new_info.compress_type = info.compress_type
-                new_info.external_attr = info.external_attr
-                new_info.comment = info.comment
-                new_info.create_system = info.create_system
-                new_info.extra = info.extra
-                if info.compress_type == ZIP_DEFLATED:
-                    zout.writestr(new_info, data, compress_type=ZIP_DEFLATED)
-                else:
-                    zout.writestr(new_info, data)
-
-            for arch in arch_filters:
-                ksud_bytes = ksud_bytes_by_arch.get(arch)
-                if ksud_bytes is None:
-                    continue
-                lib_path = f"lib/{arch}/libksud.so"
-                entry = ZipInfo(filename=lib_path)
-                entry.compress_type = ZIP_DEFLATED
-                zout.writestr(entry, ksud_bytes)
+                zout.copy_raw(src, info)
+
+            ksud_offset = fout.tell()
+            append_ksud_entries(zout, arch_filters, loads, strip_tool)
+            out_index = zout.close()
+            record.bytes_read = zout.bytes_read
+            record.bytes_written = zout.bytes_written
+    return ksud_offset, out_index
 
 
-def assert_required_libs(apk_path: Path, arch_filters: List[str]) -> None:
-    with ZipFile(apk_path, "r") as zf:
-        names = set(zf.namelist())
-    missing = [arch for arch in arch_filters if f"lib/{arch}/libksud.so" not in names]
+def patch_ksud_entries(
+    apk_path: Path,
+    ksud_offset: int,
+    arch_filters: List[str],
+    ksud_by_arch: Dict[str, Path],
+    strip_tool: Optional[Path] = None,
+    jobs: int = 0,
+    strip_cache: Optional[StripCache] = None,
+    loader: Optional[KsudLoader] = None,
+    timings: Optional[Timings] = None,
+) -> ApkIndex:
+    """Replace the injected libksud.so entries of a repack_apk() output in place; returns its new index."""
+    with ExitStack() as stack:
+        if loader is None:
+            loader = stack.enter_context(KsudLoader(jobs, strip_cache))
+        loads = loader.submit_all(ksud_by_arch, strip_tool)
+        record = stack.enter_context((timings or Timings()).phase(f"zip patch {apk_path.name}"))
+        with ZipFile(apk_path, "r") as zf:
+            kept = [info for info in zf.infolist() if info.header_offset < ksud_offset]
+        with open(apk_path, "r+b") as f:
+            f.seek(ksud_offset)
+            f.truncate()
+            zout = ApkZipWriter(f)
+            zout.entries = kept
+            append_ksud_entries(zout, arch_filters, loads, strip_tool)
+            out_index = zout.close()
+            record.bytes_read = zout.bytes_read
+            record.bytes_written = zout.bytes_written
+            return out_index
+
+
+def assert_required_libs(apk_path: Path, arch_filters: List[str], index: Optional[ApkIndex] = None) -> None:
+    if index is None:
+        index = ApkIndex.from_file(apk_path)
+    missing = [arch for arch in arch_filters if not index.has_lib(arch, "libksud.so")]
     if missing:
         raise RuntimeError(
             "Missing libksud.so in APK for architecture(s): " + ", ".join(missing)
@@ -307,22 +1041,619 @@ def validate_signing_config(signing: Dict[str, str]) -> None:
         raise FileNotFoundError(f"Keystore not found: {signing['keystore_path']}")
 
 
-def do_repack(args: argparse.Namespace) -> int:
-    ws_root = workspace_root()
-    config_path = Path(args.config).resolve() if args.config else ws_root / "repack-config.json"
-    if config_path.exists():
-        file_cfg = load_jsonc(config_path)
+APK_SIG_BLOCK_MAGIC = b"APK Sig Block 42"
+APK_SIGNATURE_SCHEME_V2_ID = 0x7109871A
+APK_DIGEST_CHUNK_SIZE = 1 << 20
+# Signature algorithm IDs from the APK Signature Scheme v2 spec.
+SIG_RSA_PKCS1_V1_5_SHA256 = 0x0103
+SIG_RSA_PKCS1_V1_5_SHA512 = 0x0104
+SIG_ECDSA_SHA256 = 0x0201
+SIG_ECDSA_SHA512 = 0x0202
+
+
+@dataclass
+class SigningKey:
+    """Key material for the in-process v2 signer, loaded once per keystore and alias."""
+
+    algorithm: int
+    sign: Callable[[bytes], bytes]
+    certificates: List[bytes]
+    public_key: bytes
+
+    @property
+    def hash_factory(self) -> Callable[..., Any]:
+        if self.algorithm in (SIG_RSA_PKCS1_V1_5_SHA512, SIG_ECDSA_SHA512):
+            return hashlib.sha512
+        return hashlib.sha256
+
+
+def require_cryptography() -> None:
+    try:
+        import cryptography  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError(
+            "Native APK signing requires optional dependency 'cryptography'. "
+            "Install it with: pip install cryptography"
+        ) from exc
+
+
+def load_signing_key(signing: Dict[str, str]) -> SigningKey:
+    """Read the private key and certificate chain for key_alias from a PKCS#12 keystore."""
+    require_cryptography()
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+    from cryptography.hazmat.primitives.serialization import pkcs12
+
+    keystore = Path(signing["keystore_path"]).resolve()
+    data = keystore.read_bytes()
+    bundle = None
+    # PKCS#12 keystores written by keytool use the store password for the key as well.
+    for password in dict.fromkeys([signing["keystore_pass"], signing["key_pass"]]):
+        try:
+            bundle = pkcs12.load_pkcs12(data, password.encode("utf-8"))
+            break
+        except ValueError:
+            continue
+    if bundle is None or bundle.key is None or bundle.cert is None:
+        raise RuntimeError(f"Cannot read a private key from {keystore} as a PKCS#12 keystore")
+
+    alias = bundle.cert.friendly_name
+    if alias is not None and alias.decode("utf-8", "replace").lower() != signing["key_alias"].lower():
+        raise RuntimeError(f"Key alias '{signing['key_alias']}' not found in {keystore}")
+
+    key = bundle.key
+    if isinstance(key, rsa.RSAPrivateKey):
+        if key.key_size > 3072:
+            algorithm, digest = SIG_RSA_PKCS1_V1_5_SHA512, hashes.SHA512()
+        else:
+            algorithm, digest = SIG_RSA_PKCS1_V1_5_SHA256, hashes.SHA256()
+
+        def sign(message: bytes) -> bytes:
+            return key.sign(message, padding.PKCS1v15(), digest)
+
+    elif isinstance(key, ec.EllipticCurvePrivateKey):
+        if key.curve.key_size > 256:
+            algorithm, digest = SIG_ECDSA_SHA512, hashes.SHA512()
+        else:
+            algorithm, digest = SIG_ECDSA_SHA256, hashes.SHA256()
+
+        def sign(message: bytes) -> bytes:
+            return key.sign(message, ec.ECDSA(digest))
+
     else:
-        if args.config:
-            raise FileNotFoundError(f"Config not found: {config_path}")
-        print(f"[WARN] Config not found, using defaults and CLI overrides: {config_path}", file=sys.stderr)
-        file_cfg = {}
-    cfg = merge_config(file_cfg, args)
+        raise RuntimeError(f"Unsupported signing key type in {keystore}: {type(key).__name__}")
+
+    chain = [bundle.cert.certificate] + [extra.certificate for extra in bundle.additional_certs]
+    return SigningKey(
+        algorithm=algorithm,
+        sign=sign,
+        certificates=[cert.public_bytes(serialization.Encoding.DER) for cert in chain],
+        public_key=key.public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+        ),
+    )
+
+
+def length_prefixed(data: bytes) -> bytes:
+    return struct.pack("<I", len(data)) + data
+
+
+def end_of_central_directory(f: BinaryIO) -> Tuple[int, int]:
+    """Return (central directory offset, EOCD offset) of a non-zip64 ZIP."""
+    size = f.seek(0, os.SEEK_END)
+    tail_start = max(0, size - ZIP_END_RECORD.size - 0xFFFF)
+    f.seek(tail_start)
+    tail = f.read()
+    pos = tail.rfind(ZIP_END_SIG)
+    while pos >= 0:
+        if pos + ZIP_END_RECORD.size <= len(tail):
+            fields = ZIP_END_RECORD.unpack_from(tail, pos)
+            if pos + ZIP_END_RECORD.size + fields[7] == len(tail):
+                break
+        pos = tail.rfind(ZIP_END_SIG, 0, pos)
+    if pos < 0:
+        raise RuntimeError("End of central directory record not found")
+
+    eocd_offset = tail_start + pos
+    cd_size, cd_offset = fields[5], fields[6]
+    if cd_offset == ZIP32_LIMIT or cd_offset + cd_size != eocd_offset:
+        raise RuntimeError("Unsupported ZIP layout for v2 signing (zip64 or data after central directory)")
+    return cd_offset, eocd_offset
+
+
+def apk_signing_block_offset(f: BinaryIO, cd_offset: int) -> Optional[int]:
+    """Offset of the APK Signing Block ending at cd_offset, or None if the APK has none."""
+    footer = struct.Struct("<Q16s")
+    if cd_offset < 8 + footer.size:
+        return None
+    f.seek(cd_offset - footer.size)
+    block_size, magic = footer.unpack(f.read(footer.size))
+    if magic != APK_SIG_BLOCK_MAGIC:
+        return None
+    block_offset = cd_offset - block_size - 8
+    if block_offset < 0:
+        raise RuntimeError("APK Signing Block size is out of range")
+    f.seek(block_offset)
+    if struct.unpack("<Q", f.read(8))[0] != block_size:
+        raise RuntimeError("APK Signing Block header and footer sizes differ")
+    return block_offset
+
+
+def v2_chunk_digest(hash_factory: Callable[..., Any], chunk: Union[bytes, memoryview]) -> bytes:
+    digest = hash_factory(b"\xa5" + struct.pack("<I", len(chunk)))
+    digest.update(chunk)
+    return digest.digest()
+
+
+@dataclass
+class DigestStats:
+    bytes_hashed: int
+    seconds: float
+    workers: int
+
+    def describe(self) -> str:
+        size_mb = self.bytes_hashed / (1024 * 1024)
+        rate = size_mb / self.seconds if self.seconds > 0 else float("inf")
+        return f"{size_mb:.1f} MB in {self.seconds:.3f} s ({rate:.1f} MB/s, {self.workers} thread(s))"
+
+
+class V2ContentDigest:
+    """v2 content digest of a memory-mapped APK, hashed in 1 MB chunks on a thread pool.
+
+    sections are (start, end) file ranges digested in order, followed by
+    end_record (the EOCD as it must be seen by the digest). Hashing starts in
+    the constructor, so the caller can do other I/O until result(). hashlib
+    releases the GIL while hashing, so the chunks are hashed in parallel.
+    """
+
+    def __init__(
+        self,
+        mm: mmap.mmap,
+        sections: List[Tuple[int, int]],
+        end_record: bytes,
+        hash_factory: Callable[..., Any],
+        jobs: int = 0,
+    ):
+        self.mm = mm
+        self.hash_factory = hash_factory
+        ranges = [
+            (pos, min(pos + APK_DIGEST_CHUNK_SIZE, end))
+            for start, end in sections
+            for pos in range(start, end, APK_DIGEST_CHUNK_SIZE)
+        ]
+        self.end_record = end_record
+        self.bytes_hashed = sum(end - start for start, end in ranges) + len(end_record)
+        self.workers = resolve_jobs(jobs, len(ranges))
+        self.can_advise = hasattr(mm, "madvise") and hasattr(mmap, "MADV_DONTNEED")
+        self.started = time.perf_counter()
+        self.pool: Optional[ThreadPoolExecutor] = None
+        if self.workers > 1:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="v2-digest")
+            self._digests: Iterable[bytes] = self.pool.map(self._digest_range, ranges)
+        else:
+            self._digests = map(self._digest_range, ranges)
+        self.seconds = 0.0
+
+    def _digest_range(self, byte_range: Tuple[int, int]) -> bytes:
+        start, end = byte_range
+        with memoryview(self.mm) as view, view[start:end] as chunk:
+            digest = v2_chunk_digest(self.hash_factory, chunk)
+        if self.can_advise:
+            # Drop the pages only this chunk covers from our RSS; they stay in the page cache.
+            first = -(-start // mmap.PAGESIZE) * mmap.PAGESIZE
+            last = end // mmap.PAGESIZE * mmap.PAGESIZE
+            if last > first:
+                self.mm.madvise(mmap.MADV_DONTNEED, first, last - first)
+        return digest
+
+    def result(self) -> bytes:
+        chunk_digests = list(self._digests)
+        end = self.end_record
+        chunk_digests += [
+            v2_chunk_digest(self.hash_factory, end[pos : pos + APK_DIGEST_CHUNK_SIZE])
+            for pos in range(0, len(end), APK_DIGEST_CHUNK_SIZE)
+        ]
+        self.seconds = time.perf_counter() - self.started
+        return self.hash_factory(b"\x5a" + struct.pack("<I", len(chunk_digests)) + b"".join(chunk_digests)).digest()
+
+    @property
+    def stats(self) -> DigestStats:
+        return DigestStats(self.bytes_hashed, self.seconds, self.workers)
+
+    def close(self) -> None:
+        # Workers hold views into the mmap; they must finish before it can be closed.
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "V2ContentDigest":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def build_v2_signing_block(key: SigningKey, content_digest: bytes) -> bytes:
+    """Wrap one v2 signer over content_digest in an APK Signing Block."""
+    signed_data = (
+        length_prefixed(length_prefixed(struct.pack("<I", key.algorithm) + length_prefixed(content_digest)))
+        + length_prefixed(b"".join(length_prefixed(cert) for cert in key.certificates))
+        + length_prefixed(b"")
+    )
+    signature = key.sign(signed_data)
+    signer = (
+        length_prefixed(signed_data)
+        + length_prefixed(length_prefixed(struct.pack("<I", key.algorithm) + length_prefixed(signature)))
+        + length_prefixed(key.public_key)
+    )
+    value = length_prefixed(length_prefixed(signer))
+    pair = struct.pack("<QI", 4 + len(value), APK_SIGNATURE_SCHEME_V2_ID) + value
+    block_size = len(pair) + 8 + len(APK_SIG_BLOCK_MAGIC)
+    return struct.pack("<Q", block_size) + pair + struct.pack("<Q", block_size) + APK_SIG_BLOCK_MAGIC
+
+
+def copy_range(src: BinaryIO, dst: BinaryIO, length: int) -> None:
+    """Copy length bytes from the current position of src to dst."""
+    while length:
+        chunk = src.read(min(length, COPY_CHUNK_SIZE))
+        if not chunk:
+            raise RuntimeError("Unexpected end of file while copying")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def sign_apk_v2(src: Path, dst: Path, key: SigningKey, jobs: int = 0) -> Tuple[int, DigestStats]:
+    """Write src to dst with an APK Signature Scheme v2 block.
+
+    The ZIP entries are copied to dst while worker threads hash them through
+    an mmap of src; returns the bytes written and the digest throughput.
+    """
+    with src.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, atomic_output(dst) as out:
+        cd_offset, eocd_offset = end_of_central_directory(f)
+        if apk_signing_block_offset(f, cd_offset) is not None:
+            raise RuntimeError("APK already has a signing block")
+        # The EOCD is digested as if it pointed at the signing block, which is where the
+        # central directory starts in the unsigned file.
+        end_record = bytearray(mm[eocd_offset:])
+        sections = [(0, cd_offset), (cd_offset, eocd_offset)]
+        with V2ContentDigest(mm, sections, bytes(end_record), key.hash_factory, jobs) as digest:
+            f.seek(0)
+            copy_range(f, out, cd_offset)
+            content_digest = digest.result()
+
+        block = build_v2_signing_block(key, content_digest)
+        struct.pack_into("<L", end_record, 16, cd_offset + len(block))
+        out.write(block)
+        out.write(mm[cd_offset:eocd_offset])
+        out.write(end_record)
+        written = out.tell()
+    return written, digest.stats
+
+
+def split_length_prefixed(data: bytes) -> List[bytes]:
+    """Split a sequence of uint32 length-prefixed values."""
+    items: List[bytes] = []
+    pos = 0
+    while pos < len(data):
+        if pos + 4 > len(data):
+            raise RuntimeError("Truncated length-prefixed value in APK Signing Block")
+        (size,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        if pos + size > len(data):
+            raise RuntimeError("Truncated length-prefixed value in APK Signing Block")
+        items.append(data[pos : pos + size])
+        pos += size
+    return items
+
+
+def verify_v2_signature(public_key: bytes, algorithm: int, signature: bytes, message: bytes) -> None:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+
+    key = serialization.load_der_public_key(public_key)
+    digest = hashes.SHA512() if algorithm in (SIG_RSA_PKCS1_V1_5_SHA512, SIG_ECDSA_SHA512) else hashes.SHA256()
+    try:
+        if algorithm in (SIG_RSA_PKCS1_V1_5_SHA256, SIG_RSA_PKCS1_V1_5_SHA512) and isinstance(key, rsa.RSAPublicKey):
+            key.verify(signature, message, padding.PKCS1v15(), digest)
+        elif algorithm in (SIG_ECDSA_SHA256, SIG_ECDSA_SHA512) and isinstance(key, ec.EllipticCurvePublicKey):
+            key.verify(signature, message, ec.ECDSA(digest))
+        else:
+            raise RuntimeError(f"Signature algorithm 0x{algorithm:04x} does not match the signer's public key")
+    except InvalidSignature as exc:
+        raise RuntimeError(f"Invalid signature (algorithm 0x{algorithm:04x})") from exc
+
+
+def verify_apk_v2(apk_path: Path, jobs: int = 0) -> Tuple[int, List[DigestStats]]:
+    """Check every v2 signer of apk_path; returns the signer count and digest throughput.
+
+    Raises RuntimeError when the APK has no v2 block, a signature does not
+    verify or a content digest does not match.
+    """
+    require_cryptography()
+    from cryptography import x509
+    from cryptography.hazmat.primitives import serialization
+
+    supported = {
+        SIG_RSA_PKCS1_V1_5_SHA256: hashlib.sha256,
+        SIG_RSA_PKCS1_V1_5_SHA512: hashlib.sha512,
+        SIG_ECDSA_SHA256: hashlib.sha256,
+        SIG_ECDSA_SHA512: hashlib.sha512,
+    }
+    with apk_path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        cd_offset, eocd_offset = end_of_central_directory(f)
+        block_offset = apk_signing_block_offset(f, cd_offset)
+        if block_offset is None:
+            raise RuntimeError("APK has no APK Signing Block")
+
+        v2_value = None
+        pos, pairs_end = block_offset + 8, cd_offset - 24
+        while pos < pairs_end:
+            pair_size, pair_id = struct.unpack_from("<QI", mm, pos)
+            if pair_size < 4 or pos + 8 + pair_size > pairs_end:
+                raise RuntimeError("Malformed ID-value pair in APK Signing Block")
+            if pair_id == APK_SIGNATURE_SCHEME_V2_ID:
+                v2_value = mm[pos + 12 : pos + 8 + pair_size]
+            pos += 8 + pair_size
+        if v2_value is None:
+            raise RuntimeError("APK Signing Block has no APK Signature Scheme v2 block")
+
+        (signers_data,) = split_length_prefixed(v2_value)
+        signers = split_length_prefixed(signers_data)
+        if not signers:
+            raise RuntimeError("v2 block has no signers")
+
+        expected: Dict[int, bytes] = {}
+        try:
+            for signer in signers:
+                signed_data, signatures, public_key = split_length_prefixed(signer)
+                digests, certificates = split_length_prefixed(signed_data)[:2]
+                certs = split_length_prefixed(certificates)
+                if not certs:
+                    raise RuntimeError("v2 signer has no certificates")
+                cert_key = x509.load_der_x509_certificate(certs[0]).public_key()
+                if cert_key.public_bytes(
+                    serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+                ) != public_key:
+                    raise RuntimeError("v2 signer public key does not match its first certificate")
+
+                signature_records = [
+                    (struct.unpack_from("<I", entry)[0], entry[4:]) for entry in split_length_prefixed(signatures)
+                ]
+                digest_records = [
+                    (struct.unpack_from("<I", entry)[0], entry[4:]) for entry in split_length_prefixed(digests)
+                ]
+                # Like apksigner, require the same algorithms, in the same order, in both records.
+                if [algorithm for algorithm, _ in signature_records] != [algorithm for algorithm, _ in digest_records]:
+                    raise RuntimeError("v2 signer's signature and digest algorithms differ")
+
+                checked = 0
+                for algorithm, value in signature_records:
+                    if algorithm in supported:
+                        (signature,) = split_length_prefixed(value)
+                        verify_v2_signature(public_key, algorithm, signature, signed_data)
+                        checked += 1
+                if not checked:
+                    raise RuntimeError("v2 signer uses no supported signature algorithm")
+                for algorithm, value in digest_records:
+                    if algorithm in supported:
+                        (expected[algorithm],) = split_length_prefixed(value)
+        except struct.error as exc:
+            raise RuntimeError(f"Truncated v2 signer record: {exc}") from exc
+
+        # The digest covers the EOCD with its central directory offset pointing at the signing block.
+        end_record = bytearray(mm[eocd_offset:])
+        struct.pack_into("<L", end_record, 16, block_offset)
+        sections = [(0, block_offset), (cd_offset, eocd_offset)]
+        stats: List[DigestStats] = []
+        computed: Dict[Callable[..., Any], bytes] = {}
+        for algorithm, want in expected.items():
+            hash_factory = supported[algorithm]
+            if hash_factory not in computed:
+                with V2ContentDigest(mm, sections, bytes(end_record), hash_factory, jobs) as digest:
+                    computed[hash_factory] = digest.result()
+                stats.append(digest.stats)
+            if computed[hash_factory] != want:
+                raise RuntimeError(f"Content digest mismatch (algorithm 0x{algorithm:04x})")
+    return len(signers), stats
+
+REPACK_MANIFEST_FORMAT = 1
+
+
+def fingerprint_file(path: Path, previous: Any = None) -> Dict[str, Any]:
+    """Size, mtime and SHA-256 of a file; the hash is reused when size and mtime are unchanged."""
+    st = path.stat()
+    if (
+        isinstance(previous, dict)
+        and previous.get("size") == st.st_size
+        and previous.get("mtime_ns") == st.st_mtime_ns
+        and previous.get("sha256")
+    ):
+        return dict(previous)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": cached_file_sha256(path)}
+
+
+def file_unchanged(path: Path, recorded: Any) -> bool:
+    if not isinstance(recorded, dict) or not path.exists():
+        return False
+    st = path.stat()
+    return recorded.get("size") == st.st_size and recorded.get("mtime_ns") == st.st_mtime_ns
+
+
+def load_repack_manifest(path: Path) -> Dict[str, Any]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("format") != REPACK_MANIFEST_FORMAT:
+        return {}
+    return manifest
+
+
+def build_repack_inputs(
+    apk: Path,
+    arch_filters: List[str],
+    ksud_by_arch: Dict[str, Path],
+    strip_tool: Optional[Path],
+    signing: Dict[str, str],
+    previous: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Describe everything that determines the repack output, for comparison with the last run."""
+    prev_inputs = previous.get("inputs", {})
+    prev_ksud = prev_inputs.get("ksud", {}) if isinstance(prev_inputs, dict) else {}
+    strip: Optional[Dict[str, Any]] = None
+    if strip_tool is not None:
+        st = strip_tool.stat()
+        strip = {"tool": str(strip_tool), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    keystore = Path(signing["keystore_path"]).resolve()
+    return {
+        "apk": {"path": str(apk), **fingerprint_file(apk, prev_inputs.get("apk"))},
+        "ksud": {
+            arch: {"path": str(path), **fingerprint_file(path, prev_ksud.get(arch))}
+            for arch, path in ksud_by_arch.items()
+        },
+        "arch": list(arch_filters),
+        "strip": strip,
+        "signing": {
+            "keystore": str(keystore),
+            "keystore_sha256": fingerprint_file(keystore)["sha256"],
+            "key_alias": signing["key_alias"],
+        },
+    }
+
+
+def without_mtimes(value: Any) -> Any:
+    """Drop mtimes so a file that was touched but not changed still compares equal."""
+    if isinstance(value, dict):
+        return {k: without_mtimes(v) for k, v in value.items() if k != "mtime_ns"}
+    if isinstance(value, list):
+        return [without_mtimes(v) for v in value]
+    return value
+
+
+def only_ksud_content_changed(old: Any, new: Dict[str, Any]) -> bool:
+    """True when the inputs differ only in ksud file contents (same arches, same everything else)."""
+    if not isinstance(old, dict) or not isinstance(old.get("ksud"), dict):
+        return False
+    old_rest = {k: v for k, v in old.items() if k != "ksud"}
+    new_rest = {k: v for k, v in new.items() if k != "ksud"}
+    return without_mtimes(old_rest) == without_mtimes(new_rest) and set(old["ksud"]) == set(new["ksud"])
+
+
+T = TypeVar("T")
+
+
+class RepackContext:
+    """State shared by every APK built in one invocation.
+
+    Tool discovery, the input APK's central directory and stripped ksud loads
+    are resolved once and reused across variants, which may run concurrently.
+    """
+
+    def __init__(self, args: argparse.Namespace, timings: Optional[Timings] = None):
+        strip_cache = None
+        if not args.no_strip_cache:
+            strip_cache = StripCache(default_strip_cache_dir(), args.cache_max_mb * 1024 * 1024)
+        self.strip_cache = strip_cache
+        self.timings = timings or Timings()
+        self.toolchain = ToolchainIndex(refresh=args.refresh_tools)
+        self.loader = KsudLoader(args.jobs, strip_cache, self.timings)
+        # (kind, name) -> (stamp of the input, result)
+        self._memo: Dict[Tuple[str, str], Tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _memoized(self, key: Tuple[str, str], compute: Callable[[], T], stamp: Any = None) -> T:
+        """compute()'s result for key; recomputed, replacing the old one, when the input's stamp changes."""
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is None or entry[0] != stamp:
+                entry = self._memo[key] = (stamp, compute())
+            return entry[1]
+
+    def _timed(self, phase: str, compute: Callable[[], T]) -> Callable[[], T]:
+        def run() -> T:
+            with self.timings.phase(phase):
+                return compute()
+
+        return run
+
+    def strip_tool(self) -> Optional[Path]:
+        return self._memoized(
+            ("tool", "strip"), self._timed("tool discovery strip", lambda: find_strip_tool(self.toolchain))
+        )
+
+    def android_tool(self, name: str) -> Optional[Path]:
+        return self._memoized(
+            ("tool", name), self._timed(f"tool discovery {name}", lambda: find_android_tool(name, self.toolchain))
+        )
+
+    def signing_key(self, signing: Dict[str, str], required: bool) -> Optional[SigningKey]:
+        """Key for the in-process signer, or None to sign with apksigner instead."""
+
+        def load() -> Optional[SigningKey]:
+            try:
+                return load_signing_key(signing)
+            except (OSError, RuntimeError) as exc:
+                if required:
+                    raise
+                print(f"[WARN] Native signing unavailable, using apksigner: {exc}", file=sys.stderr)
+                return None
+
+        keystore = Path(signing["keystore_path"]).resolve()
+        st = keystore.stat()
+        return self._memoized(
+            ("signing key", f"{keystore}:{signing['key_alias']}"),
+            self._timed("load signing key", load),
+            (st.st_mtime_ns, st.st_size),
+        )
+
+    def latest_apk(self, app_build_type: str) -> Path:
+        return self._memoized(("apk", app_build_type), lambda: find_latest_apk(app_build_type))
+
+    def apk_index(self, apk: Path) -> ApkIndex:
+        st = apk.stat()
+        return self._memoized(
+            ("index", str(apk)),
+            self._timed(f"apk index {apk.name}", lambda: ApkIndex.from_file(apk)),
+            (st.st_mtime_ns, st.st_size),
+        )
+
+    def forget(self, *kinds: str) -> None:
+        """Drop memoized results of some kinds ("apk", "index", ...) so they are looked up again."""
+        with self._lock:
+            for key in [key for key in self._memo if key[0] in kinds]:
+                del self._memo[key]
+
+    def close(self) -> None:
+        self.loader.close()
 
-    apk = find_latest_apk(cfg["app_build_type"])
+    def __enter__(self) -> "RepackContext":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def load_repack_config(args: argparse.Namespace, timings: Optional[Timings] = None) -> dict:
+    with (timings or Timings()).phase("config load") as record:
+        config_path = Path(args.config).resolve() if args.config else workspace_root() / "repack-config.json"
+        if config_path.exists():
+            record.bytes_read = config_path.stat().st_size
+            file_cfg = load_jsonc(config_path)
+        else:
+            if args.config:
+                raise FileNotFoundError(f"Config not found: {config_path}")
+            print(f"[WARN] Config not found, using defaults and CLI overrides: {config_path}", file=sys.stderr)
+            file_cfg = {}
+        return merge_config(file_cfg, args)
+
+
+def run_repack(cfg: dict, args: argparse.Namespace, ctx: RepackContext) -> List[str]:
+    """Build one signed APK described by cfg; returns the summary lines to print."""
+    apk = ctx.latest_apk(cfg["app_build_type"])
+    apk_index = ctx.apk_index(apk)
     arch_filters = cfg.get("arch", [])
     if not arch_filters:
-        inferred = collect_existing_arches(apk)
+        inferred = collect_existing_arches(apk, apk_index)
         if inferred:
             arch_filters = inferred
         else:
@@ -332,7 +1663,7 @@ def do_repack(args: argparse.Namespace) -> int:
     ksud_by_arch = find_ksud_binaries_by_arch(cfg["ksud_build_type"], arch_filters)
     missing_ksud_arches = [arch for arch in arch_filters if arch not in ksud_by_arch]
     if missing_ksud_arches:
-        existing_ksud_arches = set(collect_existing_ksud_arches(apk))
+        existing_ksud_arches = set(collect_existing_ksud_arches(apk, apk_index))
         missing_in_apk = [arch for arch in missing_ksud_arches if arch not in existing_ksud_arches]
         if missing_in_apk:
             raise RuntimeError(
@@ -346,114 +1677,529 @@ def do_repack(args: argparse.Namespace) -> int:
             file=sys.stderr,
         )
 
-    out_dir = Path(args.out_dir).resolve() if args.out_dir else ws_root / "dist"
+    out_dir = Path(args.out_dir).resolve() if args.out_dir else workspace_root() / "dist"
     out_dir.mkdir(parents=True, exist_ok=True)
 
     output_name = cfg.get("output_name") or apk.stem
-    unsigned_path = out_dir / f"{output_name}-repack-unsigned.apk"
-    aligned_path = out_dir / f"{output_name}-repack-aligned.apk"
     signed_path = out_dir / f"{output_name}.apk"
-
-    # Clean stale outputs before repacking.
-    for stale in (unsigned_path, aligned_path, signed_path):
-        if stale.exists():
-            stale.unlink()
+    # The aligned, unsigned APK and the manifest are kept so the next run can patch them. The
+    # APK is kept as .zip so `dist/*.apk` globs and `find dist -name '*.apk'` only see signed output.
+    state_dir = out_dir / ".cache" / "repack"
+    aligned_path = state_dir / f"{output_name}.aligned.zip"
+    manifest_path = state_dir / f"{output_name}.json"
 
     # Resolve strip tool.
     do_strip: bool = bool(cfg.get("strip", False))
     strip_tool: Optional[Path] = None
     if do_strip:
-        strip_tool = find_strip_tool()
+        strip_tool = ctx.strip_tool()
         if strip_tool is None:
             print("[WARN] strip requested but no strip tool found; skipping strip.", file=sys.stderr)
-        else:
-            print(f"[INFO] Strip tool: {strip_tool}")
+
+    signing = cfg.get("signing", {})
+    validate_signing_config(signing)
+
+    manifest = {} if args.force else load_repack_manifest(manifest_path)
+    with ctx.timings.phase(f"fingerprint inputs {output_name}"):
+        inputs = build_repack_inputs(apk, arch_filters, ksud_by_arch, strip_tool, signing, manifest)
+    old_inputs = manifest.get("inputs")
+    if without_mtimes(old_inputs) == without_mtimes(inputs) and file_unchanged(signed_path, manifest.get("output")):
+        return [f"[INFO] {signed_path} is up to date"]
+    incremental = only_ksud_content_changed(old_inputs, inputs) and file_unchanged(
+        aligned_path, manifest.get("aligned")
+    )
+
+    # Clean stale outputs before repacking.
+    stale_paths = [signed_path, manifest_path] if incremental else [signed_path, manifest_path, aligned_path]
+    for stale in stale_paths:
+        if stale.exists():
+            stale.unlink()
+    state_dir.mkdir(parents=True, exist_ok=True)
 
     try:
-        repack_apk(apk, unsigned_path, arch_filters, ksud_by_arch, strip_tool)
-        assert_required_libs(unsigned_path, arch_filters)
-
-        zipalign = find_android_tool("zipalign")
-        if zipalign is None:
-            raise FileNotFoundError("zipalign not found in PATH or Android SDK build-tools")
-        run_cmd(
-            [str(zipalign), "-P", "16", "-f", "4", str(unsigned_path), str(aligned_path)],
-            "zipalign failed",
-        )
+        if incremental:
+            print(f"[INFO] {output_name}: only ksud changed, patching libksud.so entries of the previous output")
+            ksud_offset = int(manifest["ksud_offset"])
+            out_index = patch_ksud_entries(
+                aligned_path,
+                ksud_offset,
+                arch_filters,
+                ksud_by_arch,
+                strip_tool,
+                loader=ctx.loader,
+                timings=ctx.timings,
+            )
+        else:
+            # The writer places STORED entries at 4 bytes and .so files at 16 KB as it goes.
+            ksud_offset, out_index = repack_apk(
+                apk,
+                aligned_path,
+                arch_filters,
+                ksud_by_arch,
+                strip_tool,
+                loader=ctx.loader,
+                index=apk_index,
+                timings=ctx.timings,
+            )
+        assert_required_libs(aligned_path, arch_filters, out_index)
+
+        if args.verify_align:
+            zipalign = ctx.android_tool("zipalign")
+            if zipalign is None:
+                raise FileNotFoundError("zipalign not found in PATH or Android SDK build-tools")
+            with ctx.timings.phase(f"align verify {output_name}") as record:
+                record.bytes_read = aligned_path.stat().st_size
+                run_cmd(
+                    [str(zipalign), "-c", "-P", "16", "4", str(aligned_path)],
+                    "zipalign verification failed",
+                )
 
-        signing = cfg.get("signing", {})
-        validate_signing_config(signing)
-
-        apksigner = find_android_tool("apksigner")
-        if apksigner is None:
-            raise FileNotFoundError("apksigner not found in PATH or Android SDK build-tools")
-
-        run_cmd(
-            [
-                str(apksigner),
-                "sign",
-                "--v1-signing-enabled",
-                "false",
-                "--v2-signing-enabled",
-                "true",
-                "--v3-signing-enabled",
-                "false",
-                "--v4-signing-enabled",
-                "false",
-                "--ks",
-                str(Path(signing["keystore_path"]).resolve()),
-                "--ks-key-alias",
-                signing["key_alias"],
-                "--ks-pass",
-                f"pass:{signing['keystore_pass']}",
-                "--key-pass",
-                f"pass:{signing['key_pass']}",
-                "--out",
-                str(signed_path),
-                str(aligned_path),
-            ],
-            "apksigner failed",
-        )
-    finally:
-        # Remove intermediate files regardless of success/failure.
-        for tmp in (unsigned_path, aligned_path):
-            if tmp.exists():
-                tmp.unlink()
+        signing_key = None if args.signer == "apksigner" else ctx.signing_key(signing, args.signer == "native")
+        digest_stats: Optional[DigestStats] = None
+        apksigner: Optional[Path] = None
+        if signing_key is None or args.verify_signature:
+            apksigner = ctx.android_tool("apksigner")
+            if apksigner is None:
+                raise FileNotFoundError("apksigner not found in PATH or Android SDK build-tools")
+
+        with ctx.timings.phase(f"sign {output_name}") as record:
+            record.bytes_read = aligned_path.stat().st_size
+            if signing_key is not None:
+                record.bytes_written, digest_stats = sign_apk_v2(
+                    aligned_path, signed_path, signing_key, args.digest_jobs
+                )
+            else:
+                run_cmd(
+                    [
+                        str(apksigner),
+                        "sign",
+                        "--v1-signing-enabled",
+                        "false",
+                        "--v2-signing-enabled",
+                        "true",
+                        "--v3-signing-enabled",
+                        "false",
+                        "--v4-signing-enabled",
+                        "false",
+                        "--ks",
+                        str(Path(signing["keystore_path"]).resolve()),
+                        "--ks-key-alias",
+                        signing["key_alias"],
+                        "--ks-pass",
+                        f"pass:{signing['keystore_pass']}",
+                        "--key-pass",
+                        f"pass:{signing['key_pass']}",
+                        "--out",
+                        str(signed_path),
+                        str(aligned_path),
+                    ],
+                    "apksigner failed",
+                )
+                record.bytes_written = signed_path.stat().st_size
+
+        if args.verify_signature:
+            with ctx.timings.phase(f"sign verify {output_name}") as record:
+                record.bytes_read = signed_path.stat().st_size
+                run_cmd([str(apksigner), "verify", str(signed_path)], "apksigner verification failed")
+    except BaseException:
+        # A half-written intermediate must not be patched by the next run.
+        if aligned_path.exists():
+            aligned_path.unlink()
+        raise
+
+    write_bytes_atomic(
+        manifest_path,
+        json.dumps(
+            {
+                "format": REPACK_MANIFEST_FORMAT,
+                "inputs": inputs,
+                "ksud_offset": ksud_offset,
+                "aligned": fingerprint_file(aligned_path),
+                "output": fingerprint_file(signed_path),
+            },
+            indent=2,
+        ).encode("utf-8"),
+    )
 
-    print(f"Input APK : {apk}")
     if ksud_by_arch:
         ksud_desc = ", ".join(f"{arch}={path}" for arch, path in ksud_by_arch.items())
     else:
         ksud_desc = "NOT FOUND"
-    print(f"ksud      : {ksud_desc}")
-    print(f"Strip     : {'yes (' + str(strip_tool) + ')' if strip_tool else ('requested but unavailable' if do_strip else 'no')}")
-    print(f"Arch      : {', '.join(arch_filters)}")
-    print(f"Output    : {signed_path}")
+    return [
+        f"Input APK : {apk}",
+        f"ksud      : {ksud_desc}",
+        f"Strip     : {'yes (' + str(strip_tool) + ')' if strip_tool else ('requested but unavailable' if do_strip else 'no')}",
+        f"Arch      : {', '.join(arch_filters)}",
+        f"Mode      : {'incremental (libksud.so only)' if incremental else 'full'}",
+        f"Signer    : {'native (v2)' if signing_key is not None else 'apksigner'}",
+        f"Output    : {signed_path}",
+    ] + ([f"Digest    : {digest_stats.describe()}"] if digest_stats else [])
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process, or None where the resource module is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def report_peak_memory(max_memory_mb: int) -> None:
+    peak = peak_rss_bytes()
+    if peak is None:
+        print("Peak RSS  : unavailable on this platform")
+        return
+    print(f"Peak RSS  : {peak / (1024 * 1024):.1f} MB")
+    if max_memory_mb and peak > max_memory_mb * 1024 * 1024:
+        raise RuntimeError(f"Peak RSS {peak / (1024 * 1024):.1f} MB exceeds --max-memory {max_memory_mb} MB")
+
+
+def print_strip_cache_summary(ctx: RepackContext) -> None:
+    cache = ctx.strip_cache
+    if cache is not None and cache.hits + cache.misses:
+        print(f"Cache     : {cache.hits} hit(s), {cache.misses} miss(es) in {cache.root}")
+
+
+def report_timings(args: argparse.Namespace, timings: Timings) -> None:
+    if args.timings:
+        print()
+        for line in timings.table_lines():
+            print(line)
+    if args.timings_json:
+        trace_path = Path(args.timings_json).resolve()
+        trace_path.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(trace_path, json.dumps(timings.chrome_trace(), indent=1).encode("utf-8"))
+        print(f"Trace     : {trace_path}")
+
+
+def do_repack(args: argparse.Namespace) -> int:
+    timings = Timings()
+    cfg = load_repack_config(args, timings)
+    with RepackContext(args, timings) as ctx:
+        for line in run_repack(cfg, args, ctx):
+            print(line)
+        print_strip_cache_summary(ctx)
+    report_timings(args, timings)
+    report_peak_memory(args.max_memory)
     return 0
 
 
-def build_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        description="Repack manager APK with ksud injection, zipalign(16KB), and resign."
+def do_repack_all(args: argparse.Namespace) -> int:
+    timings = Timings()
+    cfg = load_repack_config(args, timings)
+    variants = cfg["variants"]
+    if not variants:
+        raise ValueError("No 'variants' configured; use 'repack' for a single APK")
+
+    failed: List[str] = []
+    with RepackContext(args, timings) as ctx:
+        workers = resolve_jobs(args.workers, len(variants))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            builds = [(variant["output_name"], pool.submit(run_repack, variant, args, ctx)) for variant in variants]
+            for name, build in builds:
+                print(f"== {name} ==")
+                try:
+                    lines = build.result()
+                except Exception as exc:  # noqa: BLE001
+                    failed.append(name)
+                    print(f"[ERROR] {exc}", file=sys.stderr)
+                    continue
+                for line in lines:
+                    print(line)
+        print_strip_cache_summary(ctx)
+    report_timings(args, timings)
+    report_peak_memory(args.max_memory)
+
+    if failed:
+        print(f"[ERROR] {len(failed)} of {len(variants)} variant(s) failed: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+@dataclass
+class WatchTarget:
+    """A directory to watch, which file names in it matter and what kind of input they are."""
+
+    directory: Path
+    kind: str
+    matches: Callable[[str], bool]
+
+
+def repack_watch_targets(cfg: dict) -> List[WatchTarget]:
+    target_root = workspace_root() / "target"
+    # Only the arches the repack uses ksud for: the configured ones, else those built on disk,
+    # else run_repack()'s default.
+    arches = (
+        cfg.get("arch")
+        or [arch for arch, triple in ARCH_TO_TRIPLE.items() if (target_root / triple / cfg["ksud_build_type"]).is_dir()]
+        or ["arm64-v8a"]
     )
-    subparsers = parser.add_subparsers(dest="command", required=True)
+    targets = [
+        WatchTarget(target_root / ARCH_TO_TRIPLE[arch] / cfg["ksud_build_type"], "ksud", "ksud".__eq__)
+        for arch in arches
+        if arch in ARCH_TO_TRIPLE
+    ]
+    apk_dir = workspace_root() / "manager" / "app" / "build" / "outputs" / "apk" / cfg["app_build_type"]
+    targets.append(WatchTarget(apk_dir, "apk", lambda name: name.endswith(".apk")))
+    return targets
+
+
+class PollingWatcher:
+    """Detects changes by comparing stat snapshots of the watched files every interval seconds."""
+
+    def __init__(self, targets: List[WatchTarget], interval: float):
+        self.targets = targets
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Tuple[str, str], Tuple[int, int, int]]:
+        snapshot: Dict[Tuple[str, str], Tuple[int, int, int]] = {}
+        for target in self.targets:
+            try:
+                entries = list(os.scandir(target.directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if target.matches(entry.name):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[(target.kind, entry.path)] = (st.st_mtime_ns, st.st_size, st.st_ino)
+        return snapshot
+
+    def poll(self, timeout: Optional[float]) -> Set[str]:
+        """Wait up to timeout seconds (forever if None) and return the kinds of input that changed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            if snapshot != self._snapshot:
+                changed = {key[0] for key, _ in set(snapshot.items()) ^ set(self._snapshot.items())}
+                self._snapshot = snapshot
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic())))
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify on the watched directories, through libc via ctypes.
+
+    A directory that does not exist (yet, or any more after cargo clean) is
+    waited for by watching its nearest existing parent; the watch moves down
+    as the missing directories are created.
+    """
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_IGNORED = 0x8000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, targets: List[WatchTarget]):
+        import ctypes
+
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watch descriptor -> watched directory, and the targets in or waiting below it.
+        self._paths: Dict[int, Path] = {}
+        self._targets: Dict[int, List[WatchTarget]] = {}
+        try:
+            for target in targets:
+                self._arm(target)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _arm(self, target: WatchTarget) -> bool:
+        """Watch target's directory, or its nearest existing parent; True if the directory itself."""
+        import ctypes
+
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        path = target.directory
+        while True:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+            if wd >= 0:
+                break
+            err = ctypes.get_errno()
+            if err not in (errno.ENOENT, errno.ENOTDIR) or path.parent == path:
+                raise OSError(err, f"inotify_add_watch failed: {os.strerror(err)}", str(path))
+            path = path.parent
+        self._paths[wd] = path
+        self._targets.setdefault(wd, []).append(target)
+        return path == target.directory
+
+    def _has_match(self, target: WatchTarget) -> bool:
+        try:
+            return any(target.matches(entry.name) for entry in os.scandir(target.directory))
+        except OSError:
+            return False
+
+    def _rearm(self, wd: int, targets: List[WatchTarget], changed: Set[str]) -> None:
+        """Move targets off wd; a target whose directory is now watched counts as changed if it has inputs."""
+        remaining = [target for target in self._targets.get(wd, []) if all(target is not t for t in targets)]
+        if remaining:
+            self._targets[wd] = remaining
+        elif wd in self._targets:
+            del self._targets[wd]
+            del self._paths[wd]
+            self._libc.inotify_rm_watch(self._fd, wd)
+        self._arm_all(targets, changed)
+
+    def _arm_all(self, targets: List[WatchTarget], changed: Set[str]) -> None:
+        for target in targets:
+            if self._arm(target) and self._has_match(target):
+                changed.add(target.kind)
+
+    def poll(self, timeout: Optional[float]) -> Set[str]:
+        """Wait up to timeout seconds (forever if None) and return the kinds of input that changed."""
+        import select
+
+        changed: Set[str] = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + self.EVENT.size <= len(data):
+                wd, event_mask, _, name_len = self.EVENT.unpack_from(data, pos)
+                name = os.fsdecode(data[pos + self.EVENT.size : pos + self.EVENT.size + name_len].rstrip(b"\0"))
+                pos += self.EVENT.size + name_len
+                path = self._paths.get(wd)
+                if path is None:
+                    # Left over from a watch removed by _rearm().
+                    continue
+                targets = self._targets[wd]
+                if event_mask & self.IN_IGNORED:
+                    # The directory itself went away (e.g. cargo clean): wait for it below a parent.
+                    del self._targets[wd]
+                    del self._paths[wd]
+                    changed.update(target.kind for target in targets if target.directory == path)
+                    self._arm_all(targets, changed)
+                    continue
+                changed.update(target.kind for target in targets if target.directory == path and target.matches(name))
+                if event_mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    appeared = [
+                        target
+                        for target in targets
+                        if target.directory != path and target.directory.relative_to(path).parts[0] == name
+                    ]
+                    if appeared:
+                        self._rearm(wd, appeared, changed)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def open_watcher(targets: List[WatchTarget], poll_interval: float, force_poll: bool) -> Any:
+    missing = [str(target.directory) for target in targets if not target.directory.is_dir()]
+    if missing:
+        print(f"[INFO] Waiting for missing directories to appear: {', '.join(missing)}")
+    if force_poll or not sys.platform.startswith("linux"):
+        return PollingWatcher(targets, poll_interval)
+    try:
+        return InotifyWatcher(targets)
+    except (OSError, AttributeError) as exc:
+        print(f"[WARN] inotify unavailable ({exc}); polling instead", file=sys.stderr)
+        return PollingWatcher(targets, poll_interval)
+
+
+def do_watch(args: argparse.Namespace) -> int:
+    cfg = load_repack_config(args)
+    targets = repack_watch_targets(cfg)
+    with RepackContext(args) as ctx:
+        watcher = open_watcher(targets, args.poll_interval, args.poll)
+        mode = "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+        print(f"[INFO] Watching {len(targets)} director{'y' if len(targets) == 1 else 'ies'} ({mode})")
+        changed = {"ksud", "apk"}
+        changed_at: Optional[float] = None
+        try:
+            while True:
+                if "apk" in changed:
+                    # A new build may have another file name; drop the old one's index too.
+                    ctx.forget("apk", "index")
+                ctx.timings = ctx.loader.timings = Timings()
+                try:
+                    for line in run_repack(cfg, args, ctx):
+                        print(line)
+                    if changed_at is not None:
+                        print(f"[INFO] Done {time.perf_counter() - changed_at:.2f} s after the first change")
+                except Exception as exc:  # noqa: BLE001
+                    print(f"[ERROR] {exc}", file=sys.stderr)
+                report_timings(args, ctx.timings)
+
+                changed = watcher.poll(None)
+                changed_at = time.perf_counter()
+                # Debounce: wait for the build that touched the inputs to go quiet.
+                while True:
+                    more = watcher.poll(args.debounce)
+                    if not more:
+                        break
+                    changed |= more
+                print(f"[INFO] Changed: {', '.join(sorted(changed))}; rebuilding")
+        except KeyboardInterrupt:
+            print("[INFO] Stopped watching")
+        finally:
+            watcher.close()
+    return 0
 
-    repack = subparsers.add_parser("repack", help="Repack and resign APK")
-    repack.add_argument("-c", "--config", help="Path to jsonc config file")
-    repack.add_argument("-b", "--app-build-type", help="APK build type override, e.g. debug/release")
-    repack.add_argument("-t", "--ksud-build-type", help="ksud build type override, e.g. debug/release")
-    repack.add_argument(
+
+def do_cache(args: argparse.Namespace) -> int:
+    cache = StripCache(default_strip_cache_dir(), args.cache_max_mb * 1024 * 1024)
+    if args.action == "prune":
+        removed, removed_bytes = cache.prune(0 if args.all else None)
+        print(f"Removed   : {removed} entr{'y' if removed == 1 else 'ies'} ({removed_bytes} bytes)")
+    count, size = cache.stats()
+    print(f"Cache dir : {cache.root}")
+    print(f"Entries   : {count}")
+    print(f"Size      : {size} bytes (limit {cache.max_bytes} bytes)")
+    return 0
+
+
+def do_verify(args: argparse.Namespace) -> int:
+    failed = 0
+    for apk in args.apks:
+        try:
+            signers, stats = verify_apk_v2(Path(apk), args.jobs)
+        except (OSError, RuntimeError, ValueError) as exc:
+            failed += 1
+            print(f"[ERROR] {apk}: {exc}", file=sys.stderr)
+            continue
+        print(f"[INFO] {apk}: APK Signature Scheme v2 verified, {signers} signer(s)")
+        for digest_stats in stats:
+            print(f"Digest    : {digest_stats.describe()}")
+    return 1 if failed else 0
+
+
+def add_repack_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("-c", "--config", help="Path to jsonc config file")
+    parser.add_argument("-b", "--app-build-type", help="APK build type override, e.g. debug/release")
+    parser.add_argument("-t", "--ksud-build-type", help="ksud build type override, e.g. debug/release")
+    parser.add_argument(
         "-a",
         "--arch",
         action="append",
         help="Target architecture(s), repeat or use comma list, e.g. -a arm64-v8a -a armeabi-v7a",
     )
-    repack.add_argument("-K", "--keystore-path", help="Keystore path override")
-    repack.add_argument("-A", "--key-alias", help="Key alias override")
-    repack.add_argument("-P", "--keystore-pass", help="Keystore password override")
-    repack.add_argument("-S", "--key-pass", help="Private key password override")
-    repack.add_argument("-n", "--output-name", help="Base name for output APK files (default: input APK stem)")
-    strip_group = repack.add_mutually_exclusive_group()
+    parser.add_argument("-K", "--keystore-path", help="Keystore path override")
+    parser.add_argument("-A", "--key-alias", help="Key alias override")
+    parser.add_argument("-P", "--keystore-pass", help="Keystore password override")
+    parser.add_argument("-S", "--key-pass", help="Private key password override")
+    parser.add_argument("-n", "--output-name", help="Base name for output APK files (default: input APK stem)")
+    strip_group = parser.add_mutually_exclusive_group()
     strip_group.add_argument(
         "--strip",
         dest="strip",
@@ -468,9 +2214,146 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Disable strip even if config enables it",
     )
-    repack.add_argument("-o", "--out-dir", help="Output directory override (default: dist)")
+    parser.add_argument("-o", "--out-dir", help="Output directory override (default: dist)")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Parallel ksud strip/load workers (default: one per arch, 1 = serial)",
+    )
+    parser.add_argument(
+        "--verify-align",
+        action="store_true",
+        help="Check the aligned APK with SDK zipalign -c before signing",
+    )
+    parser.add_argument(
+        "--signer",
+        choices=["auto", "native", "apksigner"],
+        default="auto",
+        help="Sign in-process from a PKCS#12 keystore (native), with SDK apksigner, "
+        "or natively when possible and apksigner otherwise (auto, default)",
+    )
+    parser.add_argument(
+        "--digest-jobs",
+        type=int,
+        default=0,
+        help="Threads hashing the APK for the native signer (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--verify-signature",
+        action="store_true",
+        help="Check the signed APK with SDK apksigner verify",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Ignore the previous repack manifest and rebuild from the input APK",
+    )
+    parser.add_argument(
+        "--refresh-tools",
+        action="store_true",
+        help="Rescan the Android SDK/NDK instead of using the cached toolchain index",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print wall/CPU time and bytes read/written for each phase",
+    )
+    parser.add_argument(
+        "--timings-json",
+        metavar="PATH",
+        help="Write phase timings as a Chrome trace-event JSON file",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=0,
+        metavar="MB",
+        help="Fail if the process peak RSS exceeds this many MB (peak RSS is always reported)",
+    )
+    parser.add_argument(
+        "--no-strip-cache",
+        action="store_true",
+        help="Always run the strip tool instead of reusing cached stripped ksud",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_STRIP_CACHE_MAX_MB,
+        help=f"Strip cache size limit in MB (default: {DEFAULT_STRIP_CACHE_MAX_MB})",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Repack manager APK with ksud injection, zipalign(16KB), and resign."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    repack = subparsers.add_parser("repack", help="Repack and resign APK")
+    add_repack_arguments(repack)
     repack.set_defaults(func=do_repack)
 
+    repack_all = subparsers.add_parser(
+        "repack-all", help="Build every variant from the config's 'variants' array in one run"
+    )
+    add_repack_arguments(repack_all)
+    repack_all.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=0,
+        help="Variants to build concurrently (default: one per CPU, up to the variant count)",
+    )
+    repack_all.set_defaults(func=do_repack_all)
+
+    cache = subparsers.add_parser("cache", help="Inspect or prune the stripped ksud cache")
+    cache.add_argument("action", choices=["stats", "prune"], help="Show cache usage or evict entries")
+    cache.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_STRIP_CACHE_MAX_MB,
+        help=f"Size limit in MB to prune down to (default: {DEFAULT_STRIP_CACHE_MAX_MB})",
+    )
+    cache.add_argument("--all", action="store_true", help="With prune, remove every cached entry")
+    cache.set_defaults(func=do_cache)
+
+    verify = subparsers.add_parser(
+        "verify", help="Check the v2 signature of signed APK(s) and report digest throughput"
+    )
+    verify.add_argument("apks", nargs="+", metavar="APK", help="Signed APK(s) to check")
+    verify.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Threads hashing each APK (default: one per CPU)",
+    )
+    verify.set_defaults(func=do_verify)
+
+    watch = subparsers.add_parser(
+        "watch", help="Repack whenever ksud or the input APK is rebuilt, reusing state between builds"
+    )
+    add_repack_arguments(watch)
+    watch.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        metavar="SECONDS",
+        help="Quiet time after the last change before rebuilding (default: 0.2)",
+    )
+    watch.add_argument("--poll", action="store_true", help="Poll for changes instead of using inotify")
+    watch.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.1,
+        metavar="SECONDS",
+        help="Polling period when inotify is unavailable or --poll is given (default: 0.1)",
+    )
+    watch.set_defaults(func=do_watch)
+
     return parser
 
 
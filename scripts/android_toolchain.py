@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""On-disk index of Android SDK/NDK directory layouts.
+
+Locating build-tools, NDK versions and prebuilt host tags means listing
+several directories and probing for executables, which is slow on network
+home directories and Windows runners. The index stores those listings in a
+JSON cache keyed by directory path; an entry is reused as long as the mtime
+of every directory it was built from is unchanged, so a stat per directory
+replaces the listings and probes.
+
+Used by repack_apk.py and scripts/setup_cargo_config.py, both as
+scripts.android_toolchain.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+
+CACHE_FORMAT = 1
+CACHE_ENV = "KSU_TOOLCHAIN_CACHE"
+
+
+def default_cache_path() -> Path:
+    override = os.environ.get(CACHE_ENV)
+    if override:
+        return Path(override).expanduser()
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "kernelsu" / "android-toolchain.json"
+
+
+def dir_stamp(path: Path) -> int:
+    """Directory mtime in ns, or -1 when it does not exist."""
+    try:
+        st = path.stat()
+    except OSError:
+        return -1
+    return st.st_mtime_ns
+
+
+def list_dir(path: Path, dirs: bool) -> list[str]:
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return []
+    return sorted(entry.name for entry in entries if entry.is_dir() == dirs)
+
+
+class ToolchainIndex:
+    """Cached listings of SDK and NDK roots.
+
+    sdk() answers "which NDK versions and build-tools are installed" and
+    ndk() answers "which host tags and bin/ tools does this NDK ship". Pass
+    refresh=True to ignore the cache and rescan everything.
+    """
+
+    def __init__(self, cache_path: Path | None = None, refresh: bool = False):
+        self.cache_path = cache_path or default_cache_path()
+        self.refresh = refresh
+        self._entries: dict[str, Any] | None = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, Any]:
+        if self._entries is None:
+            self._entries = {}
+            if not self.refresh:
+                try:
+                    data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    data = None
+                if isinstance(data, dict) and data.get("format") == CACHE_FORMAT:
+                    self._entries = data.get("entries", {})
+        return self._entries
+
+    def _lookup(self, key: str, scan: Callable[[], tuple[list[Path], Any]]) -> Any:
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if isinstance(entry, dict) and all(
+                dir_stamp(Path(path)) == stamp for path, stamp in entry.get("stamps", {}).items()
+            ):
+                return entry["data"]
+            scanned_dirs, data = scan()
+            entries[key] = {"stamps": {str(path): dir_stamp(path) for path in scanned_dirs}, "data": data}
+            self._dirty = True
+            self._save()
+            return data
+
+    def _save(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=self.cache_path.parent, prefix=f".{self.cache_path.name}.")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump({"format": CACHE_FORMAT, "entries": self._entries}, file, indent=1)
+            os.replace(tmp_name, self.cache_path)
+            self._dirty = False
+        except OSError as exc:
+            # The cache is an optimization only; keep working without it.
+            print(f"[WARN] Could not write toolchain cache {self.cache_path}: {exc}", file=sys.stderr)
+
+    def sdk(self, sdk_root: Path) -> dict[str, Any]:
+        """NDK versions under <sdk>/ndk, ndk-bundle presence and build-tools executables per version."""
+        sdk_root = sdk_root.expanduser()
+
+        def scan() -> tuple[list[Path], Any]:
+            ndk_dir = sdk_root / "ndk"
+            build_tools = sdk_root / "build-tools"
+            tool_versions = list_dir(build_tools, dirs=True)
+            data = {
+                "ndk_versions": list_dir(ndk_dir, dirs=True),
+                "ndk_bundle": (sdk_root / "ndk-bundle").is_dir(),
+                "build_tools": {version: list_dir(build_tools / version, dirs=False) for version in tool_versions},
+            }
+            scanned = [sdk_root, ndk_dir, build_tools] + [build_tools / v for v in tool_versions]
+            return scanned, data
+
+        return self._lookup(f"sdk:{sdk_root}", scan)
+
+    def ndk(self, ndk_root: Path) -> dict[str, Any] | None:
+        """Host tags under toolchains/llvm/prebuilt and their bin/ file names; None if not an NDK."""
+        ndk_root = ndk_root.expanduser()
+
+        def scan() -> tuple[list[Path], Any]:
+            prebuilt = ndk_root / "toolchains" / "llvm" / "prebuilt"
+            if not prebuilt.is_dir():
+                return [ndk_root, prebuilt], None
+            tags = list_dir(prebuilt, dirs=True)
+            data = {"host_tags": {tag: list_dir(prebuilt / tag / "bin", dirs=False) for tag in tags}}
+            return [ndk_root, prebuilt] + [prebuilt / tag / "bin" for tag in tags], data
+
+        return self._lookup(f"ndk:{ndk_root}", scan)
@@ -6,12 +6,18 @@ import platform
 import sys
 from pathlib import Path
 
-
 REPO_ROOT = Path(__file__).resolve().parent.parent
+if not __package__:
+    # Run as scripts/setup_cargo_config.py rather than python -m scripts.setup_cargo_config.
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.android_toolchain import ToolchainIndex  # noqa: E402
+
+
 DEFAULT_OUTPUT = REPO_ROOT / ".cargo" / "config.toml"
 
 
-def detect_ndk_root(cli_value: str | None) -> Path:
+def detect_ndk_root(cli_value: str | None, index: ToolchainIndex) -> Path:
     candidates = []
     if cli_value:
         candidates.append(Path(cli_value).expanduser())
@@ -25,13 +31,11 @@ def detect_ndk_root(cli_value: str | None) -> Path:
     if android_home:
         sdk_root = Path(android_home).expanduser()
         candidates.append(sdk_root / "ndk-bundle")
-        ndk_dir = sdk_root / "ndk"
-        if ndk_dir.is_dir():
-            versions = sorted((path for path in ndk_dir.iterdir() if path.is_dir()), reverse=True)
-            candidates.extend(versions)
+        versions = sorted(index.sdk(sdk_root)["ndk_versions"], reverse=True)
+        candidates.extend(sdk_root / "ndk" / version for version in versions)
 
     for candidate in candidates:
-        if (candidate / "toolchains" / "llvm" / "prebuilt").is_dir():
+        if index.ndk(candidate) is not None:
             return candidate.resolve()
 
     raise FileNotFoundError(
@@ -59,19 +63,20 @@ def guess_host_tags() -> list[str]:
     raise RuntimeError(f"Unsupported host platform: {platform.system()} {platform.machine()}")
 
 
-def resolve_host_tag(ndk_root: Path, cli_value: str | None) -> str:
+def resolve_host_tag(ndk_root: Path, cli_value: str | None, index: ToolchainIndex) -> str:
     prebuilt_dir = ndk_root / "toolchains" / "llvm" / "prebuilt"
+    ndk = index.ndk(ndk_root)
+    host_tags = ndk["host_tags"] if ndk else {}
     if cli_value:
-        candidate = prebuilt_dir / cli_value
-        if candidate.is_dir():
+        if cli_value in host_tags:
             return cli_value
-        raise FileNotFoundError(f"NDK host tag does not exist: {candidate}")
+        raise FileNotFoundError(f"NDK host tag does not exist: {prebuilt_dir / cli_value}")
 
     for tag in guess_host_tags():
-        if (prebuilt_dir / tag).is_dir():
+        if tag in host_tags:
             return tag
 
-    available = sorted(path.name for path in prebuilt_dir.iterdir() if path.is_dir())
+    available = sorted(host_tags)
     raise FileNotFoundError(
         "Unable to detect a matching NDK host tag. "
         f"Available tags: {', '.join(available) or '(none)'}"
@@ -164,6 +169,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Overwrite the output file if it already exists.",
     )
+    parser.add_argument(
+        "--refresh-tools",
+        action="store_true",
+        help="Rescan the NDK instead of using the cached toolchain index.",
+    )
     return parser.parse_args()
 
 
@@ -171,8 +181,9 @@ def main() -> int:
     args = parse_args()
 
     try:
-        ndk_root = detect_ndk_root(args.ndk_root)
-        host_tag = resolve_host_tag(ndk_root, args.host_tag)
+        index = ToolchainIndex(refresh=args.refresh_tools)
+        ndk_root = detect_ndk_root(args.ndk_root, index)
+        host_tag = resolve_host_tag(ndk_root, args.host_tag, index)
         rendered = render_config(ndk_root, host_tag, args.api_level)
     except (FileNotFoundError, RuntimeError) as exc:
         print(f"error: {exc}", file=sys.stderr)
@@ -0,0 +1,43 @@
+"""Factoring of compile commands into templates (kernel/.vscode/compdb_template.py)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "kernel" / ".vscode"))
+
+from compdb_template import expand_command, factor_command  # noqa: E402
+
+
+def kbuild_command(directory: str, name: str) -> str:
+    """A compile command shaped like Kbuild's, with an include path under drivers/core."""
+    return (
+        f"clang -Wp,-MMD,{directory}/.{name}.o.d -nostdinc -I./drivers/core/include -Iinclude/core "
+        f"-DKBUILD_MODFILE='\"{directory}/{name}\"' -DKBUILD_BASENAME='\"{name}\"' "
+        f"-DKBUILD_MODNAME='\"{name}\"' -D__KBUILD_MODNAME=kmod_{name} "
+        f"-c -o {directory}/{name}.o {directory}/{name}.c"
+    )
+
+
+def test_short_basename_in_include_path() -> None:
+    command = kbuild_command("drivers/base", "core")
+    template = factor_command(command, "drivers/base/core.o", "drivers/base/core.c")
+    assert template == (
+        "clang -Wp,-MMD,%d/.%b.o.d -nostdinc -I./drivers/core/include -Iinclude/core "
+        "-DKBUILD_MODFILE='\"%d/%b\"' -DKBUILD_BASENAME='\"%b\"' "
+        "-DKBUILD_MODNAME='\"%b\"' -D__KBUILD_MODNAME=kmod_%b "
+        "-c -o %o %s"
+    )
+    assert expand_command(template, "drivers/base/core.o", "drivers/base/core.c") == command
+    # Files built with the same flags share the template, whether or not their name is in a path.
+    assert factor_command(kbuild_command("drivers/base", "bus"), "drivers/base/bus.o", "drivers/base/bus.c") == template
+
+
+@pytest.mark.parametrize("name", ["core", "main", "base", "c", "o", "include", "drivers", "kmod"])
+def test_round_trip(name: str) -> None:
+    for directory in ("drivers/base", "drivers/core", "mm"):
+        command = kbuild_command(directory, name) + " -DFOO=100%"
+        output, source = f"{directory}/{name}.o", f"{directory}/{name}.c"
+        assert expand_command(factor_command(command, output, source), output, source) == command
@@ -0,0 +1,315 @@
+"""Round trip of repack_apk's in-process APK Signature Scheme v2 signer.
+
+A throwaway key and self-signed certificate are written to a PKCS#12
+keystore, a small zip is signed with sign_apk_v2(), and the result is
+checked against the v2 spec by code that shares nothing with the signer:
+the signing block is walked by hand, the chunked content digest recomputed
+and the signature verified with the certificate. apksigner also checks the
+output when it is on PATH. The permissions of everything repack writes are
+checked as well.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa  # noqa: E402
+from cryptography.hazmat.primitives.serialization import pkcs12  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import bench_repack  # noqa: E402
+import repack_apk  # noqa: E402
+
+PASSWORD = "test-pass"
+ALIAS = "test"
+CHUNK = 1024 * 1024
+
+
+@pytest.fixture
+def umask_022(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    # repack_apk reads the umask once at import.
+    monkeypatch.setattr(repack_apk, "_UMASK", 0o022)
+    old = os.umask(0o022)
+    try:
+        yield
+    finally:
+        os.umask(old)
+
+
+def write_keystore(path: Path, key_type: str) -> x509.Certificate:
+    if key_type == "rsa":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "repack test")])
+    start = datetime.datetime(2020, 1, 1)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(start)
+        .not_valid_after(start + datetime.timedelta(days=365 * 50))
+        .sign(key, hashes.SHA256())
+    )
+    path.write_bytes(
+        pkcs12.serialize_key_and_certificates(
+            ALIAS.encode(), key, cert, None, serialization.BestAvailableEncryption(PASSWORD.encode())
+        )
+    )
+    return cert
+
+
+def write_zip(path: Path) -> Dict[str, bytes]:
+    rng = random.Random(1)
+    # The stored entry is larger than a digest chunk, so the content spans several chunks.
+    contents = {
+        "AndroidManifest.xml": b"<manifest/>" * 100,
+        "classes.dex": rng.randbytes(CHUNK + CHUNK // 2),
+        "res/raw/text.txt": b"hello " * 5000,
+    }
+    with ZipFile(path, "w") as zf:
+        for name, data in contents.items():
+            zf.writestr(name, data, ZIP_STORED if name == "classes.dex" else ZIP_DEFLATED)
+    return contents
+
+
+def signing_config(keystore: Path) -> Dict[str, str]:
+    return {"keystore_path": str(keystore), "key_alias": ALIAS, "keystore_pass": PASSWORD, "key_pass": PASSWORD}
+
+
+def read_prefixed(data: bytes) -> List[bytes]:
+    items = []
+    pos = 0
+    while pos < len(data):
+        (size,) = struct.unpack_from("<I", data, pos)
+        items.append(data[pos + 4 : pos + 4 + size])
+        pos += 4 + size
+    assert pos == len(data)
+    return items
+
+
+def find_v2_block(apk: bytes) -> Tuple[bytes, int, int, int]:
+    """Return (v2 block value, signing block offset, central directory offset, EOCD offset)."""
+    eocd_offset = apk.rindex(b"PK\x05\x06")
+    (cd_offset,) = struct.unpack_from("<I", apk, eocd_offset + 16)
+    size_in_footer, magic = struct.unpack_from("<Q16s", apk, cd_offset - 24)
+    assert magic == b"APK Sig Block 42"
+    block_offset = cd_offset - size_in_footer - 8
+    (size_in_header,) = struct.unpack_from("<Q", apk, block_offset)
+    assert size_in_header == size_in_footer
+
+    pos = block_offset + 8
+    values = {}
+    while pos < cd_offset - 24:
+        pair_size, pair_id = struct.unpack_from("<QI", apk, pos)
+        values[pair_id] = apk[pos + 12 : pos + 8 + pair_size]
+        pos += 8 + pair_size
+    assert pos == cd_offset - 24
+    return values[0x7109871A], block_offset, cd_offset, eocd_offset
+
+
+def content_digest(apk: bytes, block_offset: int, cd_offset: int, eocd_offset: int) -> bytes:
+    eocd = bytearray(apk[eocd_offset:])
+    struct.pack_into("<I", eocd, 16, block_offset)
+    chunk_digests = []
+    for section in (apk[:block_offset], apk[cd_offset:eocd_offset], bytes(eocd)):
+        for pos in range(0, len(section), CHUNK):
+            chunk = section[pos : pos + CHUNK]
+            chunk_digests.append(hashlib.sha256(b"\xa5" + struct.pack("<I", len(chunk)) + chunk).digest())
+    return hashlib.sha256(b"\x5a" + struct.pack("<I", len(chunk_digests)) + b"".join(chunk_digests)).digest()
+
+
+def check_v2_signature(apk_path: Path, cert: x509.Certificate, algorithm: int) -> None:
+    apk = apk_path.read_bytes()
+    v2_value, block_offset, cd_offset, eocd_offset = find_v2_block(apk)
+    (signers,) = read_prefixed(v2_value)
+    (signer,) = read_prefixed(signers)
+    signed_data, signatures, public_key = read_prefixed(signer)
+    digests, certificates, _attributes = read_prefixed(signed_data)
+
+    (digest_entry,) = read_prefixed(digests)
+    assert struct.unpack_from("<I", digest_entry)[0] == algorithm
+    assert read_prefixed(digest_entry[4:]) == [content_digest(apk, block_offset, cd_offset, eocd_offset)]
+    assert read_prefixed(certificates) == [cert.public_bytes(serialization.Encoding.DER)]
+    assert public_key == cert.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    (signature_entry,) = read_prefixed(signatures)
+    assert struct.unpack_from("<I", signature_entry)[0] == algorithm
+    (signature,) = read_prefixed(signature_entry[4:])
+    cert_key = cert.public_key()
+    if isinstance(cert_key, rsa.RSAPublicKey):
+        cert_key.verify(signature, signed_data, padding.PKCS1v15(), hashes.SHA256())
+    else:
+        cert_key.verify(signature, signed_data, ec.ECDSA(hashes.SHA256()))
+
+
+@pytest.mark.parametrize("key_type, algorithm", [("rsa", 0x0103), ("ec", 0x0201)])
+def test_sign_apk_v2_round_trip(tmp_path: Path, umask_022: None, key_type: str, algorithm: int) -> None:
+    keystore = tmp_path / "test.p12"
+    cert = write_keystore(keystore, key_type)
+    unsigned = tmp_path / "unsigned.zip"
+    contents = write_zip(unsigned)
+    signed = tmp_path / "signed.apk"
+
+    key = repack_apk.load_signing_key(signing_config(keystore))
+    assert key.algorithm == algorithm
+    written, _stats = repack_apk.sign_apk_v2(unsigned, signed, key, jobs=2)
+
+    assert written == signed.stat().st_size
+    assert signed.stat().st_mode & 0o777 == 0o644
+    with ZipFile(signed) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == contents
+    check_v2_signature(signed, cert, algorithm)
+    assert repack_apk.verify_apk_v2(signed)[0] == 1
+
+    apksigner = shutil.which("apksigner")
+    if apksigner:
+        subprocess.run([apksigner, "verify", "--min-sdk-version", "24", str(signed)], check=True)
+
+
+def test_sign_apk_v2_keeps_existing_mode(tmp_path: Path, umask_022: None) -> None:
+    keystore = tmp_path / "test.p12"
+    write_keystore(keystore, "ec")
+    unsigned = tmp_path / "unsigned.zip"
+    write_zip(unsigned)
+    signed = tmp_path / "signed.apk"
+    signed.write_bytes(b"")
+    signed.chmod(0o640)
+
+    repack_apk.sign_apk_v2(unsigned, signed, repack_apk.load_signing_key(signing_config(keystore)))
+    assert signed.stat().st_mode & 0o777 == 0o640
+
+
+def test_write_bytes_atomic_mode(tmp_path: Path, umask_022: None) -> None:
+    path = tmp_path / "trace.json"
+    repack_apk.write_bytes_atomic(path, b"{}")
+    assert path.read_bytes() == b"{}"
+    assert path.stat().st_mode & 0o777 == 0o644
+
+    path.chmod(0o600)
+    repack_apk.write_bytes_atomic(path, b"[]")
+    assert path.stat().st_mode & 0o777 == 0o600
+
+
+def test_repack_all_modes(tmp_path: Path) -> None:
+    abis = ["arm64-v8a", "x86_64"]
+    workspace = bench_repack.build_workspace(
+        tmp_path,
+        argparse.Namespace(
+            entries=20, entry_size=1024, stored_ratio=0.5, dex_count=1, abis=abis, ksud_size=64 * 1024, seed=1
+        ),
+    )
+    write_keystore(workspace["keystore"], "ec")
+    config = {
+        "signing": signing_config(workspace["keystore"]),
+        "app_build_type": "release",
+        "ksud_build_type": "release",
+        "variants": [
+            {"output_name": "manager-arm64", "arch": ["arm64-v8a"]},
+            {"output_name": "manager-all", "arch": abis},
+        ],
+    }
+    (tmp_path / "repack-config.json").write_text(json.dumps(config), encoding="utf-8")
+    env = dict(
+        os.environ,
+        PATH=f"{workspace['bin']}{os.pathsep}{os.environ.get('PATH', '')}",
+        KSU_TOOLCHAIN_CACHE=str(tmp_path / "android-toolchain.json"),
+    )
+    subprocess.run(
+        [sys.executable, str(tmp_path / "repack_apk.py"), "repack-all", "--strip", "--workers", "2"],
+        cwd=tmp_path,
+        env=env,
+        check=True,
+        umask=0o022,
+    )
+
+    dist = tmp_path / "dist"
+    assert sorted(path.name for path in dist.glob("*.apk")) == ["manager-all.apk", "manager-arm64.apk"]
+    strip_cache = list((dist / ".cache" / "strip").iterdir())
+    assert len([path for path in strip_cache if path.suffix == ".bin"]) == len(abis)
+    for path in [dist, *dist.rglob("*")]:
+        expected = 0o755 if path.is_dir() else 0o644
+        assert path.stat().st_mode & 0o777 == expected, path
+
+
+def write_crafted_apk(
+    path: Path, unsigned: Path, key: repack_apk.SigningKey, digests: List[bytes], signatures: List[Optional[bytes]]
+) -> None:
+    """Sign unsigned with hand-built digest and signature records; a None signature is computed."""
+    lp = repack_apk.length_prefixed
+    apk = unsigned.read_bytes()
+    eocd_offset = apk.rindex(b"PK\x05\x06")
+    (cd_offset,) = struct.unpack_from("<I", apk, eocd_offset + 16)
+    signed_data = lp(b"".join(lp(d) for d in digests)) + lp(lp(key.certificates[0])) + lp(b"")
+    records = [
+        entry if entry is not None else struct.pack("<I", key.algorithm) + lp(key.sign(signed_data))
+        for entry in signatures
+    ]
+    signer = lp(signed_data) + lp(b"".join(lp(r) for r in records)) + lp(key.public_key)
+    value = lp(lp(signer))
+    pair = struct.pack("<QI", 4 + len(value), 0x7109871A) + value
+    block_size = len(pair) + 24
+    block = struct.pack("<Q", block_size) + pair + struct.pack("<Q", block_size) + b"APK Sig Block 42"
+    eocd = bytearray(apk[eocd_offset:])
+    struct.pack_into("<I", eocd, 16, cd_offset + len(block))
+    path.write_bytes(apk[:cd_offset] + block + apk[cd_offset:eocd_offset] + bytes(eocd))
+
+
+def test_verify_rejects_malformed_signers(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    keystore = tmp_path / "test.p12"
+    write_keystore(keystore, "rsa")
+    key = repack_apk.load_signing_key(signing_config(keystore))
+    unsigned = tmp_path / "unsigned.zip"
+    write_zip(unsigned)
+    apk = unsigned.read_bytes()
+    eocd_offset = apk.rindex(b"PK\x05\x06")
+    (cd_offset,) = struct.unpack_from("<I", apk, eocd_offset + 16)
+    digest = struct.pack("<I", 0x0103) + repack_apk.length_prefixed(
+        content_digest(apk, cd_offset, cd_offset, eocd_offset)
+    )
+
+    good = tmp_path / "good.apk"
+    write_crafted_apk(good, unsigned, key, [digest], [None])
+    # An extra digest record the verifier cannot check still has to match a signature record.
+    mismatched = tmp_path / "mismatched.apk"
+    write_crafted_apk(mismatched, unsigned, key, [digest, struct.pack("<I", 0x0999) + b"\0" * 4], [None])
+    truncated = tmp_path / "truncated.apk"
+    write_crafted_apk(truncated, unsigned, key, [digest], [None, b"\x01\x02"])
+
+    assert repack_apk.verify_apk_v2(good)[0] == 1
+    with pytest.raises(RuntimeError, match="algorithms differ"):
+        repack_apk.verify_apk_v2(mismatched)
+    with pytest.raises(RuntimeError, match="Truncated"):
+        repack_apk.verify_apk_v2(truncated)
+
+    # A bad APK is reported and the remaining ones are still verified.
+    args = argparse.Namespace(apks=[str(truncated), str(mismatched), str(good)], jobs=0)
+    assert repack_apk.do_verify(args) == 1
+    out, err = capsys.readouterr()
+    assert err.count("[ERROR]") == 2
+    assert f"{good}: APK Signature Scheme v2 verified" in out